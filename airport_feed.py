@@ -0,0 +1,76 @@
+# Airport catalog as a compact, versioned JSON document for the browser.
+#
+# The version is a digest of the airport rows, so it survives restarts and
+# only changes when new_airports does. Clients that already hold a version
+# ask for ?since=<version> and get just the changed and removed airports when
+# that version is still in the history; otherwise they get the full list.
+# Each (version, since) payload is encoded and compressed once and served
+# through assets.Asset, so it gets an ETag and gzip/brotli like static files.
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from airports import get_catalog
+from assets import Asset
+
+FIELDS = ["code", "name", "lat", "lon"]
+
+
+def catalog_rows(catalog):
+    return {code: [code, catalog.names[i], round(float(catalog.lat[i]), 5), round(float(catalog.lon[i]), 5)]
+            for i, code in enumerate(catalog.codes)}
+
+
+class AirportFeed:
+    def __init__(self, history=8):
+        self.history = history
+        self._snapshots = OrderedDict()  # version -> {code: row}, oldest first
+        self._responses = {}  # (version, since) -> Asset for the current version
+        self._catalog = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _refresh(self, catalog):
+        if catalog is self._catalog:
+            return self._version
+        rows = catalog_rows(catalog)
+        version = hashlib.sha256(json.dumps(sorted(rows.values())).encode()).hexdigest()[:12]
+        self._snapshots.pop(version, None)
+        self._snapshots[version] = rows
+        while len(self._snapshots) > self.history:
+            self._snapshots.popitem(last=False)
+        if version != self._version:
+            self._responses = {}
+        self._catalog = catalog
+        self._version = version
+        return version
+
+    def _payload(self, version, since):
+        rows = self._snapshots[version]
+        old = self._snapshots.get(since) if since != version else rows
+        if old is None:
+            return {"version": version, "full": True, "fields": FIELDS, "airports": list(rows.values())}
+        changed = [row for code, row in rows.items() if old.get(code) != row]
+        removed = [code for code in old if code not in rows]
+        return {"version": version, "since": since, "full": False, "fields": FIELDS,
+                "airports": changed, "removed": removed}
+
+    # Asset holding the encoded payload for a client at `since` (None for the full list)
+    def response(self, catalog, since=None):
+        with self._lock:
+            version = self._refresh(catalog)
+            key = (version, since if since in self._snapshots else None)
+            asset = self._responses.get(key)
+            if asset is None:
+                payload = self._payload(version, key[1])
+                data = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+                asset = self._responses[key] = Asset("airports.json", data)
+            return asset
+
+
+_feed = AirportFeed()
+
+
+def get_airport_feed(storage, since=None):
+    return _feed.response(get_catalog(storage), since)
@@ -0,0 +1,111 @@
+# Airport markers for a map viewport. Below CLUSTER_MAX_ZOOM airports are
+# grouped into a lat/lon grid of CELLS_PER_TILE x CELLS_PER_TILE cells per map
+# tile and each cell is sent as one cluster (or as the airport itself if it is
+# alone); from CLUSTER_MAX_ZOOM on the individual airports are sent. Every
+# zoom tier is precomputed into a {cell: entry} grid when the catalog loads,
+# so a query only visits the cells inside the bounding box, which is roughly
+# constant per screen whatever the catalog size. Encoded responses are cached
+# per (tier, cell range).
+import json
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from airports import get_catalog
+from assets import Asset
+
+CELLS_PER_TILE = 4
+CLUSTER_MAX_ZOOM = 8
+
+
+def cell_size(zoom):
+    return 360.0 / (2 ** zoom * CELLS_PER_TILE)
+
+
+class AirportTiles:
+    def __init__(self, catalog, cache_size=1024):
+        self.catalog = catalog
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.tiers = [self._build(zoom) for zoom in range(CLUSTER_MAX_ZOOM + 1)]
+
+    def _cells(self, zoom):
+        size = cell_size(zoom)
+        ix = np.floor((self.catalog.lon + 180.0) / size).astype(np.int64)
+        iy = np.floor((self.catalog.lat + 90.0) / size).astype(np.int64)
+        return ix, iy
+
+    def _airport(self, i):
+        catalog = self.catalog
+        return [catalog.codes[i], catalog.names[i], round(float(catalog.lat[i]), 5), round(float(catalog.lon[i]), 5)]
+
+    # {(ix, iy): entry}; an entry is ("airports", rows) or ("cluster", [lat, lon, count])
+    def _build(self, zoom):
+        ix, iy = self._cells(zoom)
+        members = {}
+        for i, cell in enumerate(zip(ix.tolist(), iy.tolist())):
+            members.setdefault(cell, []).append(i)
+        grid = {}
+        for cell, idx in members.items():
+            if zoom == CLUSTER_MAX_ZOOM or len(idx) == 1:
+                grid[cell] = ("airports", [self._airport(i) for i in idx])
+            else:
+                lat = float(self.catalog.lat[idx].mean())
+                lon = float(self.catalog.lon[idx].mean())
+                grid[cell] = ("cluster", [round(lat, 4), round(lon, 4), len(idx)])
+        return grid
+
+    def _range(self, zoom, west, south, east, north):
+        size = cell_size(zoom)
+        return (math.floor((max(west, -180.0) + 180.0) / size), math.floor((max(south, -90.0) + 90.0) / size),
+                math.floor((min(east, 180.0) + 180.0) / size), math.floor((min(north, 90.0) + 90.0) / size))
+
+    def _query(self, tier, x0, y0, x1, y1):
+        grid = self.tiers[tier]
+        if (x1 - x0 + 1) * (y1 - y0 + 1) <= len(grid):
+            cells = ((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+            entries = (grid[cell] for cell in cells if cell in grid)
+        else:
+            entries = (entry for (x, y), entry in grid.items() if x0 <= x <= x1 and y0 <= y <= y1)
+        clusters = []
+        airports = []
+        for kind, data in entries:
+            if kind == "cluster":
+                clusters.append(data)
+            else:
+                airports.extend(data)
+        return {"zoom": tier, "clusters": clusters, "airports": airports}
+
+    # Asset with the markers for a bounding box (degrees) at a map zoom level
+    def viewport(self, west, south, east, north, zoom):
+        tier = min(max(int(zoom), 0), CLUSTER_MAX_ZOOM)
+        key = (tier,) + self._range(tier, west, south, east, north)
+        with self._lock:
+            asset = self._cache.get(key)
+            if asset is not None:
+                self._cache.move_to_end(key)
+                return asset
+        payload = self._query(*key)
+        asset = Asset("tiles.json", json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode())
+        with self._lock:
+            self._cache[key] = asset
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return asset
+
+
+_tiles = None
+_tiles_lock = threading.Lock()
+
+
+# Process-wide instance, rebuilt when the airport catalog is reloaded
+def get_airport_tiles(storage):
+    global _tiles
+    catalog = get_catalog(storage)
+    with _tiles_lock:
+        if _tiles is None or _tiles.catalog is not catalog:
+            _tiles = AirportTiles(catalog)
+        return _tiles
@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # fall back to a brute-force scan over the coordinate arrays
+    cKDTree = None
+
+EARTH_RADIUS_KM = 6371
+
+# Optional on-disk N x N distance matrix; built on first load when the path is set
+DISTANCE_MATRIX_PATH = os.environ.get("SKYCARGO_DISTANCE_MATRIX")
+
+
+# Vectorised haversine in km. Arguments broadcast, so one origin against arrays
+# of targets gives a row and origins shaped (N, 1) against targets give N x M
+def haversine(lat1, lon1, lat2, lon2):
+    lat1 = np.radians(lat1)
+    lat2 = np.radians(lat2)
+    dlat = lat2 - lat1
+    dlon = np.radians(lon2) - np.radians(lon1)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+# Distances from one origin (scalars) or many origins (1-d arrays) to every target
+def distances_from(origin_lat, origin_lon, lat, lon):
+    origin_lat = np.asarray(origin_lat, dtype=np.float64)
+    origin_lon = np.asarray(origin_lon, dtype=np.float64)
+    if origin_lat.ndim:
+        origin_lat = origin_lat[:, None]
+        origin_lon = origin_lon[:, None]
+    return haversine(origin_lat, origin_lon, np.asarray(lat), np.asarray(lon))
+
+
+# Unit-sphere vectors for lat/lon in degrees; chord length between two of them
+# is monotonic in great-circle distance, so a euclidean index answers geo queries
+def to_unit_vectors(lat, lon):
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0.0, 1.0))
+
+
+def km_to_chord(km):
+    return 2 * np.sin(min(km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+# Identifies the airport list and coordinates a matrix was built from
+def catalog_digest(catalog):
+    digest = hashlib.sha256(json.dumps(catalog.codes).encode())
+    digest.update(catalog.lat.tobytes())
+    digest.update(catalog.lon.tobytes())
+    return digest.hexdigest()
+
+
+class DistanceMatrix:
+    def __init__(self, path, codes):
+        self.path = path
+        self.codes = codes
+        self.data = np.memmap(path, dtype=np.float32, mode="r", shape=(len(codes), len(codes)))
+
+    # Writes the float32 matrix block by block so memory stays at block x N
+    @classmethod
+    def build(cls, catalog, path, block=1024):
+        n = len(catalog)
+        # A crash mid-build must not leave the old sidecar vouching for a half-written matrix
+        if os.path.exists(path + ".codes"):
+            os.remove(path + ".codes")
+        data = np.memmap(path, dtype=np.float32, mode="w+", shape=(n, n))
+        for start in range(0, n, block):
+            stop = min(start + block, n)
+            data[start:stop] = distances_from(catalog.lat[start:stop], catalog.lon[start:stop],
+                                              catalog.lat, catalog.lon)
+        data.flush()
+        del data
+        with open(path + ".codes", "w") as f:
+            json.dump({"digest": catalog_digest(catalog), "codes": catalog.codes}, f)
+        return cls(path, catalog.codes)
+
+    # Reuses a matrix on disk if it was built for the same airports at the same coordinates
+    @classmethod
+    def open_or_build(cls, catalog, path):
+        try:
+            with open(path + ".codes") as f:
+                sidecar = json.load(f)
+            if isinstance(sidecar, dict) and sidecar.get("digest") == catalog_digest(catalog):
+                return cls(path, sidecar["codes"])
+        except (OSError, ValueError, KeyError):
+            pass
+        return cls.build(catalog, path)
+
+
+class AirportCatalog:
+    def __init__(self, rows, version=0):
+        self.version = version
+        self.codes = [row[0] for row in rows]
+        self.names = [row[1] for row in rows]
+        self.lat = np.array([float(row[2]) for row in rows], dtype=np.float64)
+        self.lon = np.array([float(row[3]) for row in rows], dtype=np.float64)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.xyz = to_unit_vectors(self.lat, self.lon)
+        self.tree = cKDTree(self.xyz) if cKDTree is not None and len(rows) else None
+        self.matrix = None
+
+    @classmethod
+    def load(cls, storage, version=0):
+        return cls(storage.airport_rows(), version=version)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return code in self.index
+
+    def position(self, code):
+        i = self.index[code]
+        return self.lat[i], self.lon[i]
+
+    # Great-circle distance between two airport codes; O(1) with a distance matrix
+    def distance(self, a, b):
+        i = self.index[a]
+        j = self.index[b]
+        if self.matrix is not None:
+            return float(self.matrix.data[i, j])
+        return float(haversine(self.lat[i], self.lon[i], self.lat[j], self.lon[j]))
+
+    # Distances from an airport code to every airport, in catalog order
+    def distances(self, origin):
+        i = self.index[origin]
+        if self.matrix is not None:
+            return np.asarray(self.matrix.data[i])
+        return distances_from(self.lat[i], self.lon[i], self.lat, self.lon)
+
+    def _point(self, origin):
+        if isinstance(origin, str):
+            return self.xyz[self.index[origin]]
+        return to_unit_vectors(np.array([origin[0]]), np.array([origin[1]]))[0]
+
+    def _results(self, idx, chord):
+        km = chord_to_km(chord)
+        return [(self.codes[i], self.names[i], float(d)) for i, d in zip(idx, km)]
+
+    # k nearest airports to an airport code or a (lat, lon) pair, closest first
+    def nearest(self, origin, k=None):
+        n = len(self.codes)
+        k = n if k is None else min(k, n)
+        if k <= 0:
+            return []
+        point = self._point(origin)
+        if self.tree is not None:
+            chord, idx = self.tree.query(point, k=k)
+            return self._results(np.atleast_1d(idx), np.atleast_1d(chord))
+        chord = np.linalg.norm(self.xyz - point, axis=1)
+        if k < n:
+            idx = np.argpartition(chord, k - 1)[:k]
+            idx = idx[np.argsort(chord[idx])]
+        else:
+            idx = np.argsort(chord)
+        return self._results(idx, chord[idx])
+
+    # All airports within radius_km of the origin, closest first
+    def within(self, origin, radius_km):
+        point = self._point(origin)
+        limit = km_to_chord(radius_km)
+        if self.tree is not None:
+            idx = np.array(self.tree.query_ball_point(point, limit), dtype=np.intp)
+            chord = np.linalg.norm(self.xyz[idx] - point, axis=1)
+        else:
+            chord = np.linalg.norm(self.xyz - point, axis=1)
+            idx = np.flatnonzero(chord <= limit)
+            chord = chord[idx]
+        order = np.argsort(chord)
+        return self._results(idx[order], chord[order])
+
+
+# Process-wide catalog, loaded once and reused until invalidate_catalog() is called
+_catalog = None
+_catalog_version = 0
+_catalog_lock = threading.Lock()
+
+
+def get_catalog(storage):
+    global _catalog
+    catalog = _catalog
+    if catalog is not None:
+        return catalog
+    with _catalog_lock:
+        if _catalog is None:
+            catalog = AirportCatalog.load(storage, version=_catalog_version)
+            if DISTANCE_MATRIX_PATH:
+                catalog.matrix = DistanceMatrix.open_or_build(catalog, DISTANCE_MATRIX_PATH)
+            _catalog = catalog
+        return _catalog
+
+
+# Call after any write to new_airports (codes, names or coordinates)
+def invalidate_catalog():
+    global _catalog, _catalog_version
+    with _catalog_lock:
+        _catalog = None
+        _catalog_version += 1
@@ -1,16 +1,107 @@
-from flask import Flask, request, render_template, redirect
+from flask import Flask, Response, abort, g, has_request_context, request, render_template, redirect, jsonify
+import atexit
+import os
 import random
+import threading
 from db_connection import Database
+from schema import SchemaError, check_schema
+from storage import MySQLStorage
+from write_behind import WriteBehindStorage
+from events import EventLog
+from assets import AssetPipeline, CACHE_CONTROL, asset_response
+from airport_feed import get_airport_feed
+from airport_tiles import get_airport_tiles
+from leaderboard import leaderboard
+from weather import weather
+from python import GameSession, start_game as create_player, set_unfavorable_weather, get_airports_with_distances, fly_to_airport, buy_fuel, collect_cargo, check_status, suggest_route, get_reachable_airports
 import mysql.connector
-from math import radians, sin, cos, sqrt, atan2
+from math import radians, sin, cos, sqrt, atan2, isfinite
 
 from mysql.connector import cursor
 
 app = Flask(__name__)
+app.config["DB_POOL_SIZE"] = int(os.environ.get("SKYCARGO_DB_POOL_SIZE", 5))
+app.config["DB_CHECKOUT_TIMEOUT"] = float(os.environ.get("SKYCARGO_DB_CHECKOUT_TIMEOUT", 10))
+app.config["SLOW_QUERY_MS"] = float(os.environ["SKYCARGO_SLOW_QUERY_MS"]) if os.environ.get("SKYCARGO_SLOW_QUERY_MS") else None
+app.config["SLOW_QUERY_LOG"] = os.environ.get("SKYCARGO_SLOW_QUERY_LOG")
+# Refuse to start on unapplied migrations or hot queries doing full table scans
+app.config["SCHEMA_STRICT"] = os.environ.get("SKYCARGO_SCHEMA_STRICT") == "1"
 
-db = Database(host="localhost", user="root", password="12345", database="flight_path")
-db.connect()
-cursor=db.cursor(dictionary=True)
+db = Database(host="localhost", user="root", password="12345", database="flight_path",
+              pool_size=app.config["DB_POOL_SIZE"],
+              checkout_timeout=app.config["DB_CHECKOUT_TIMEOUT"],
+              slow_query_ms=app.config["SLOW_QUERY_MS"],
+              slow_query_log=app.config["SLOW_QUERY_LOG"])
+db_connected = db.connect()
+if db_connected:
+    try:
+        with db.connection() as conn:
+            check_schema(conn, strict=app.config["SCHEMA_STRICT"])
+    except mysql.connector.Error as err:
+        print(f"Error: {err}")
+        if app.config["SCHEMA_STRICT"]:
+            raise SchemaError(f"Schema check failed: {err}")
+
+# Per-request query counters on flask.g, summed per endpoint for /metrics
+endpoint_queries = {}  # endpoint -> [requests, queries, query seconds]
+endpoint_queries_lock = threading.Lock()
+
+@db.queries.listeners.append
+def count_request_query(shape, seconds, rows, site):
+    if has_request_context():
+        g.db_queries = g.get("db_queries", 0) + 1
+        g.db_seconds = g.get("db_seconds", 0.0) + seconds
+
+@app.after_request
+def report_request_queries(response):
+    queries = g.get("db_queries", 0)
+    seconds = g.get("db_seconds", 0.0)
+    response.headers["Server-Timing"] = f'db;dur={seconds * 1000:.2f};desc="{queries} queries"'
+    with endpoint_queries_lock:
+        totals = endpoint_queries.setdefault(request.endpoint or "unknown", [0, 0, 0.0])
+        totals[0] += 1
+        totals[1] += queries
+        totals[2] += seconds
+    return response
+storage = MySQLStorage(db)
+
+# Opt-in write-behind: player rows live in memory and are flushed to MySQL in batches
+app.config["WRITE_BEHIND"] = os.environ.get("SKYCARGO_WRITE_BEHIND") == "1"
+app.config["WRITE_BEHIND_INTERVAL"] = float(os.environ.get("SKYCARGO_WRITE_BEHIND_INTERVAL", 1.0))
+app.config["WRITE_BEHIND_JOURNAL"] = os.environ.get("SKYCARGO_WRITE_BEHIND_JOURNAL")
+app.config["WRITE_BEHIND_MAX_PLAYERS"] = int(os.environ.get("SKYCARGO_WRITE_BEHIND_MAX_PLAYERS", 10_000))
+app.config["WRITE_BEHIND_IDLE_SECONDS"] = float(os.environ.get("SKYCARGO_WRITE_BEHIND_IDLE_SECONDS", 300))
+if app.config["WRITE_BEHIND"]:
+    storage = WriteBehindStorage(storage, flush_interval=app.config["WRITE_BEHIND_INTERVAL"],
+                                 journal_path=app.config["WRITE_BEHIND_JOURNAL"],
+                                 fsync=os.environ.get("SKYCARGO_WRITE_BEHIND_FSYNC") == "1",
+                                 max_players=app.config["WRITE_BEHIND_MAX_PLAYERS"],
+                                 idle_seconds=app.config["WRITE_BEHIND_IDLE_SECONDS"])
+    atexit.register(storage.close)
+
+# Per-player weather is memory only: games unseen this long, or past the cap, lose it
+weather.max_players = int(os.environ.get("SKYCARGO_WEATHER_MAX_PLAYERS", weather.max_players))
+weather.idle_seconds = float(os.environ.get("SKYCARGO_WEATHER_IDLE_SECONDS", weather.idle_seconds))
+
+# Opt-in append-only log of game actions; rebuild players with `python events.py replay DIR`
+app.config["EVENT_LOG"] = os.environ.get("SKYCARGO_EVENT_LOG")
+events = EventLog(app.config["EVENT_LOG"]) if app.config["EVENT_LOG"] else None
+if events is not None:
+    atexit.register(events.close)
+
+# Top players by money, cargo and fastest win: loaded once here, then kept current by the game actions
+if db_connected:
+    try:
+        leaderboard.rebuild(storage)
+    except mysql.connector.Error as err:
+        print(f"Error: {err}")
+
+app.json.compact = True
+
+# Leaflet is served from here under content-hashed URLs instead of from a CDN
+assets = AssetPipeline(app.static_folder)
+assets.build()
+app.jinja_env.globals["asset_url"] = assets.url
 
 @app.route('/')
 def home():
@@ -18,13 +109,11 @@ def home():
 
 @app.route('/game')
 def game():
-    player_id = request.args.get('player_id')
+    player_id = request.args.get('player_id', type=int)
     if not player_id:
         return redirect('/')
 
-    query = "SELECT * FROM player WHERE player_id = %s"
-    cursor.execute(query, (player_id,))
-    player = cursor.fetchone()
+    player = storage.get_player(player_id)
 
     if not player:
         return redirect('/')
@@ -33,35 +122,156 @@ def game():
 
 @app.route('/game/<player_name>')
 def start_game(player_name=None):
-    cursor=db.cursor()
     if not db:
         return "Database connection failed."
-        
 
-    cursor = db.cursor()
+    # Weather is per player and in memory, so starting a game writes nothing to new_airports
+    with GameSession(storage=storage, verbose=False, events=events) as session:
+        player_id = create_player(session, player_name)
+        set_unfavorable_weather(session)
+    response = {"playerID": player_id}
+    return response
+
+# JSON game API: one request per action, no template rendering
+def run_action(action, *args):
+    with GameSession(storage=storage, verbose=False, events=events) as session:
+        result = action(session, *args)
+    if result is None:
+        return jsonify(error="Player not found"), 404
+    if isinstance(result, dict) and "error" in result:
+        return jsonify(result), 400
+    return jsonify(result)
+
+@app.route('/api/players/<int:player_id>')
+def api_status(player_id):
+    return run_action(check_status, player_id)
+
+@app.route('/api/players/<int:player_id>/airports')
+def api_nearest_airports(player_id):
+    limit = request.args.get('limit', 20, type=int)
+    with GameSession(storage=storage, verbose=False, events=events) as session:
+        airports = get_airports_with_distances(session, player_id, limit=limit)
+    if airports is None:
+        return jsonify(error="Player not found"), 404
+    return jsonify([{"code": code, "name": name, "km": round(km, 1)} for code, name, km in airports])
+
+@app.route('/api/players/<int:player_id>/reachable')
+def api_reachable_airports(player_id):
+    with GameSession(storage=storage, verbose=False, events=events) as session:
+        reachable = get_reachable_airports(session, player_id)
+    if reachable is None:
+        return jsonify(error="Player not found"), 404
+    return jsonify([{"code": code, "km": round(km, 1), "fuel": fuel_needed}
+                    for code, _, km, fuel_needed in reachable])
+
+# The request's JSON object; anything else (bad JSON, a list, a string) reads as empty
+def json_body():
+    body = request.get_json(silent=True)
+    return body if isinstance(body, dict) else {}
+
+@app.route('/api/players/<int:player_id>/fly', methods=['POST'])
+def api_fly(player_id):
+    target_airport = json_body().get('airport')
+    if not isinstance(target_airport, str) or not target_airport:
+        return jsonify(error="Missing airport"), 400
+    return run_action(fly_to_airport, player_id, target_airport)
+
+@app.route('/api/players/<int:player_id>/fuel', methods=['POST'])
+def api_buy_fuel(player_id):
+    fuel_amount = json_body().get('amount')
+    # bool is an int subclass, so true would otherwise buy 1
+    if isinstance(fuel_amount, bool) or not isinstance(fuel_amount, int) or fuel_amount <= 0:
+        return jsonify(error="Fuel amount must be a positive integer"), 400
+    return run_action(buy_fuel, player_id, fuel_amount)
+
+@app.route('/api/players/<int:player_id>/cargo', methods=['POST'])
+def api_collect_cargo(player_id):
+    return run_action(collect_cargo, player_id)
+
+@app.route('/api/players/<int:player_id>/route')
+def api_suggest_route(player_id):
+    return run_action(suggest_route, player_id)
+
+# Serves a precompressed assets.Asset with conditional GET
+def send_asset(asset, cache_control):
+    return asset_response(Response, request, asset, cache_control)
+
+@app.route('/assets/<filename>')
+def static_asset(filename):
+    asset = assets.get(filename)
+    if asset is None:
+        abort(404)
+    return send_asset(asset, CACHE_CONTROL)
+
+# Airport catalog for the map and picker; ?since=<version> returns only the changes.
+# Browsers revalidate with the ETag, so an unchanged catalog costs a 304
+@app.route('/api/airports')
+def api_airports():
+    return send_asset(get_airport_feed(storage, request.args.get('since')), "public, no-cache")
+
+# Markers for the map viewport: ?bbox=west,south,east,north&zoom=z, clustered at low zoom
+@app.route('/api/airports/tiles')
+def api_airport_tiles():
     try:
-        cursor.execute("""UPDATE new_airports SET high_consumption=0;""")
-        db.commit()
-        
-        cursor.execute(
-            """
-            INSERT INTO player (
-                screen_name, fuel_amount, total_money, cargo_collected, 
-                start_location, destination, end_location
-            ) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """,
-            (player_name, 3000, 0, 0, 'LEMD', 'LIPE', 'LEMD')
-        )
-        db.commit()
-        cursor.execute("SELECT LAST_INSERT_ID()")
-        player_id = cursor.fetchone()[0]
-        response = {"playerID": player_id}
-        return response
-
-    finally:
-        cursor.close()
-        db.close()
+        west, south, east, north = (float(value) for value in request.args.get('bbox', '').split(','))
+    except ValueError:
+        return jsonify(error="bbox must be west,south,east,north"), 400
+    if not all(isfinite(value) for value in (west, south, east, north)):
+        return jsonify(error="bbox values must be finite numbers"), 400
+    zoom = request.args.get('zoom', 0, type=int)
+    return send_asset(get_airport_tiles(storage).viewport(west, south, east, north, zoom), "public, max-age=60")
+
+# Top-K document re-encoded only when a top-K place changes; clients poll it with the ETag
+@app.route('/api/leaderboard')
+def api_leaderboard():
+    return send_asset(leaderboard.asset(), "public, no-cache")
+
+@app.route('/stats/db')
+def db_stats():
+    stats = db.stats()
+    stats["queries"] = db.queries.top()
+    if app.config["WRITE_BEHIND"]:
+        stats["write_behind"] = storage.metrics()
+    return jsonify(stats)
+
+# Prometheus text format: per-shape query totals, pool gauges and per-endpoint query counts
+# db.stats() key -> (metric name, type, help); cumulative counts are counters, current values gauges
+POOL_METRICS = {
+    "pool_size": ("size", "gauge", "Maximum connections in the pool."),
+    "open": ("open", "gauge", "Connections currently open."),
+    "in_use": ("in_use", "gauge", "Connections currently checked out."),
+    "idle": ("idle", "gauge", "Open connections waiting in the pool."),
+    "peak_in_use": ("peak_in_use", "gauge", "Most connections checked out at once since start."),
+    "checkouts": ("checkouts_total", "counter", "Connections handed out."),
+    "waits": ("waits_total", "counter", "Checkouts that had to wait for a free connection."),
+    "wait_avg_ms": ("wait_avg_ms", "gauge", "Average wait of the checkouts that waited, in milliseconds."),
+    "wait_max_ms": ("wait_max_ms", "gauge", "Longest checkout wait since start, in milliseconds."),
+    "timeouts": ("timeouts_total", "counter", "Checkouts that gave up after the checkout timeout."),
+    "reconnects": ("reconnects_total", "counter", "Idle connections replaced after a failed health check."),
+}
+
+HTTP_METRICS = (
+    ("requests_total", 0, "Requests served, per endpoint."),
+    ("request_queries_total", 1, "Database statements issued while serving requests, per endpoint."),
+    ("request_query_seconds_total", 2, "Database time spent while serving requests, per endpoint."),
+)
+
+@app.route('/metrics')
+def metrics():
+    lines = [db.queries.render_prometheus().rstrip("\n")]
+    for key, value in db.stats().items():
+        name, kind, help_text = POOL_METRICS[key]
+        lines.append(f"# HELP skycargo_db_pool_{name} {help_text}")
+        lines.append(f"# TYPE skycargo_db_pool_{name} {kind}")
+        lines.append(f"skycargo_db_pool_{name} {value}")
+    with endpoint_queries_lock:
+        endpoints = [(endpoint, list(totals)) for endpoint, totals in endpoint_queries.items()]
+    for metric, position, help_text in HTTP_METRICS:
+        lines.append(f"# HELP skycargo_http_{metric} {help_text}")
+        lines.append(f"# TYPE skycargo_http_{metric} counter")
+        for endpoint, totals in endpoints:
+            lines.append(f'skycargo_http_{metric}{{endpoint="{endpoint}"}} {totals[position]}')
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
 
 if __name__ == '__main__':
     app.run(use_reloader=True, host='127.0.0.1', port=5000)
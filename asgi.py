@@ -0,0 +1,95 @@
+# Async entry point: same pages as app.py on Quart with an aiomysql pool,
+# so requests overlap their database waits instead of holding a thread each.
+# Run with an ASGI server, e.g.  hypercorn asgi:app --bind 127.0.0.1:5000
+import os
+
+import aiomysql
+from quart import Quart, Response, abort, request, render_template, redirect
+
+from assets import AssetPipeline, CACHE_CONTROL, asset_response
+
+app = Quart(__name__)
+app.config["DB_POOL_SIZE"] = int(os.environ.get("SKYCARGO_DB_POOL_SIZE", 20))
+
+pool = None
+
+assets = AssetPipeline(app.static_folder)
+assets.build()
+app.jinja_env.globals["asset_url"] = assets.url
+
+@app.before_serving
+async def open_pool():
+    global pool
+    pool = await aiomysql.create_pool(
+        host="localhost",
+        port=3306,
+        user="root",
+        password="12345",
+        db="flight_path",
+        minsize=1,
+        maxsize=app.config["DB_POOL_SIZE"],
+        autocommit=True
+    )
+
+@app.after_serving
+async def close_pool():
+    pool.close()
+    await pool.wait_closed()
+
+@app.route('/')
+async def home():
+    return await render_template('index.html')
+
+@app.route('/game')
+async def game():
+    player_id = request.args.get('player_id')
+    if not player_id:
+        return redirect('/')
+
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute("SELECT * FROM player WHERE player_id = %s", (player_id,))
+            player = await cursor.fetchone()
+
+    if not player:
+        return redirect('/')
+
+    return await render_template('game.html', player=player)
+
+@app.route('/game/<player_name>')
+async def start_game(player_name=None):
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(
+                """
+                INSERT INTO player (
+                    screen_name, fuel_amount, total_money, cargo_collected,
+                    start_location, destination, end_location
+                )
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                """,
+                (player_name, 3000, 0, 0, 'LEMD', 'LIPE', 'LEMD')
+            )
+            player_id = cursor.lastrowid
+    # No weather roll here: weather and fuel tables live in the process that serves
+    # the game actions (app.py), and this entry point does not serve any yet
+    return {"playerID": player_id}
+
+@app.route('/assets/<filename>')
+async def static_asset(filename):
+    asset = assets.get(filename)
+    if asset is None:
+        abort(404)
+    return asset_response(Response, request, asset, CACHE_CONTROL)
+
+@app.route('/stats/db')
+async def db_stats():
+    return {
+        "pool_size": pool.maxsize,
+        "open": pool.size,
+        "idle": pool.freesize,
+        "in_use": pool.size - pool.freesize,
+    }
+
+if __name__ == '__main__':
+    app.run(host='127.0.0.1', port=5000)
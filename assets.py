@@ -0,0 +1,119 @@
+# Content-hashed, precompressed static assets (Leaflet JS and CSS).
+#
+# build() writes static/dist/<name>.<hash>.<ext> plus .gz and, when the brotli
+# package is installed, .br variants, and keeps them in memory for the
+# /assets/<name> route. The hash is of the served content, so the URL changes
+# whenever the file does and responses can be cached for a year.
+#
+#   python assets.py            (build static/dist ahead of deployment)
+import gzip
+import hashlib
+import json
+import os
+import re
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+ASSETS = ["leaflet.js", "leaflet.css"]
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+MIMETYPES = {".js": "text/javascript; charset=utf-8", ".css": "text/css; charset=utf-8",
+             ".json": "application/json"}
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+
+# Hashed files live under /assets/, so relative references are pointed back at /static/
+def _prepare(name, data):
+    if name.endswith(".css"):
+        text = data.decode()
+        text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+        text = re.sub(r"\s+", " ", text)
+        text = re.sub(r"\s*([{};:,])\s*", r"\1", text)
+        text = text.replace("url(images/", "url(/static/images/")
+        return text.strip().encode()
+    if name.endswith(".js"):
+        return re.sub(rb"//# sourceMappingURL=(\S+)", rb"//# sourceMappingURL=/static/\1", data)
+    return data
+
+
+class Asset:
+    def __init__(self, name, data):
+        stem, ext = os.path.splitext(name)
+        self.digest = hashlib.sha256(data).hexdigest()[:12]
+        self.filename = f"{stem}.{self.digest}{ext}"
+        self.mimetype = MIMETYPES.get(ext, "application/octet-stream")
+        self.variants = {"identity": data, "gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(data, quality=11)
+
+    # Picks the smallest variant the client accepts; accept(encoding) returns its quality
+    def negotiate(self, accept):
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and accept(encoding) > 0:
+                return encoding
+        return "identity"
+
+    # Strong validator per representation, since the bytes differ by encoding
+    def etag(self, encoding):
+        return self.digest if encoding == "identity" else f"{self.digest}-{encoding}"
+
+
+# Serves an Asset with conditional GET for either entry point: response_class is
+# Flask's or Quart's Response, request the current request
+def asset_response(response_class, request, asset, cache_control):
+    encoding = asset.negotiate(lambda name: request.accept_encodings[name])
+    etag = asset.etag(encoding)
+    if request.if_none_match.contains(etag):
+        response = response_class("", status=304)
+    else:
+        response = response_class(asset.variants[encoding], mimetype=asset.mimetype)
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+class AssetPipeline:
+    def __init__(self, static_folder=STATIC_FOLDER, names=ASSETS):
+        self.static_folder = static_folder
+        self.names = names
+        self.urls = {}  # logical name -> hashed URL
+        self.assets = {}  # hashed file name -> Asset
+
+    def build(self, write=True):
+        dist = os.path.join(self.static_folder, "dist")
+        manifest = {}
+        for name in self.names:
+            with open(os.path.join(self.static_folder, name), "rb") as f:
+                asset = Asset(name, _prepare(name, f.read()))
+            self.assets[asset.filename] = asset
+            self.urls[name] = f"/assets/{asset.filename}"
+            manifest[name] = asset.filename
+            if write:
+                os.makedirs(dist, exist_ok=True)
+                for encoding, data in asset.variants.items():
+                    suffix = {"identity": "", "gzip": ".gz", "br": ".br"}[encoding]
+                    path = os.path.join(dist, asset.filename + suffix)
+                    if not os.path.exists(path):
+                        with open(path, "wb") as out:
+                            out.write(data)
+        if write:
+            with open(os.path.join(dist, "manifest.json"), "w") as f:
+                json.dump(manifest, f, indent=2)
+        return manifest
+
+    # Template helper: {{ asset_url('leaflet.js') }}
+    def url(self, name):
+        return self.urls[name]
+
+    def get(self, filename):
+        return self.assets.get(filename)
+
+
+if __name__ == "__main__":
+    for name, filename in AssetPipeline().build().items():
+        print(f"{name} -> dist/{filename}")
@@ -0,0 +1,74 @@
+# Scalar calculate_distance loop vs the batched NumPy API vs distance matrix lookups
+# Usage: python benchmarks/bench_distance.py [--sizes 100 10000 50000]
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from airports import AirportCatalog, DistanceMatrix, distances_from
+from python import calculate_distance
+
+SIZES = (100, 10_000, 50_000)
+MATRIX_LIMIT = 10_000  # a 50k x 50k float32 matrix is 10 GB on disk
+
+
+def synthetic_rows(n, seed=42):
+    rng = random.Random(seed)
+    return [(f"X{i:05d}", f"Airport {i}", rng.uniform(-60, 70), rng.uniform(-180, 180))
+            for i in range(n)]
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench(n, repeat):
+    rows = synthetic_rows(n)
+    catalog = AirportCatalog(rows)
+    origin = rows[0]
+    results = {}
+
+    def scalar_loop():
+        return [calculate_distance(origin[2], origin[3], row[2], row[3]) for row in rows]
+
+    results["scalar loop"] = best_of(scalar_loop, repeat)
+    results["vectorized"] = best_of(lambda: distances_from(origin[2], origin[3], catalog.lat, catalog.lon), repeat)
+
+    if n <= MATRIX_LIMIT:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "distances.f32")
+            started = time.perf_counter()
+            catalog.matrix = DistanceMatrix.build(catalog, path)
+            results["matrix build"] = time.perf_counter() - started
+            results["matrix row"] = best_of(lambda: catalog.distances(origin[0]), repeat)
+            results["matrix pair"] = best_of(lambda: catalog.distance(origin[0], rows[-1][0]), repeat)
+            catalog.matrix = None
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'airports':>9}  {'method':<13} {'time':>12}  speedup")
+    for n in args.sizes:
+        results = bench(n, args.repeat)
+        baseline = results["scalar loop"]
+        for method, seconds in results.items():
+            speedup = "" if method == "matrix build" else f"{baseline / seconds:8.1f}x"
+            print(f"{n:>9}  {method:<13} {seconds * 1000:>9.3f} ms  {speedup}")
+
+
+if __name__ == "__main__":
+    main()
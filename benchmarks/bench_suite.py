@@ -0,0 +1,229 @@
+# Benchmarks for the distance, listing and action hot paths and the Flask routes,
+# run against the local sqlite stand-in seeded at several sizes.
+#
+# Usage:
+#   python benchmarks/bench_suite.py --save-baseline   # record benchmarks/baseline.json
+#   python benchmarks/bench_suite.py                   # compare against it; exit 1 on regression
+#
+# A compare run without a baseline exits 2 before benchmarking, so a CI job
+# that lost its baseline fails instead of passing without checking anything.
+#
+# Every case reports the median and p95 per call in microseconds. A case
+# regresses when its median is more than --threshold slower than the
+# baseline and the difference is above --min-delta-us, so timer noise on
+# sub-microsecond calls does not fail a run.
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from airports import get_catalog, invalidate_catalog
+from cargo import get_cargo_values, invalidate_cargo_values
+from local_db import connect_local
+from storage import SQLStorage
+from python import (GameSession, calculate_distance, get_airports_with_distances, fly_to_airport,
+                    buy_fuel, collect_cargo, set_unfavorable_weather, AIRPORT_LIST_LIMIT)
+
+SIZES = (100, 2_000, 20_000)
+PLAYERS = 1_000
+ROUNDS = 3
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+OUTPUT_PATH = os.path.join(ROOT, "benchmarks", "latest.json")
+
+
+# Best of ROUNDS rounds, so one slow round does not move the result; like timeit,
+# the garbage collector is off while timing
+def measure(fn, iterations):
+    fn()  # warm caches (catalog, fuel tables, planner) outside the timing
+    rounds = []
+    for _ in range(ROUNDS):
+        gc.collect()
+        gc.disable()
+        samples = []
+        for _ in range(max(iterations // ROUNDS, 1)):
+            started = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - started)
+        gc.enable()
+        samples.sort()
+        rounds.append((statistics.median(samples), samples[max(int(len(samples) * 0.95) - 1, 0)]))
+    median, p95 = min(rounds)
+    return {"median_us": round(median * 1e6, 2), "p95_us": round(p95 * 1e6, 2), "iterations": iterations}
+
+
+# Fixed pure-Python workload timed with every run; comparisons divide by it so a
+# baseline recorded on a faster or less busy machine does not flag every case
+def calibrate():
+    def work():
+        total = 0
+        for i in range(20_000):
+            total += i * i % 7
+        return total
+    return measure(work, 30)["median_us"]
+
+
+# A player parked on a cargo airport; unlimited fuel and money by default so
+# repeated flights never fail, a new player's 3000 fuel for the reachability listing
+def bench_player(storage, fuel=10 ** 12):
+    catalog = get_catalog(storage)
+    cargo_values = get_cargo_values(storage)
+    home = next(code for code in catalog.codes if code in cargo_values)
+    neighbour = next(code for code, _, _ in catalog.nearest(home) if code != home)
+    player_id = storage.create_player("bench", fuel, 10 ** 12, 0, home, 'LIPE', home)
+    return player_id, home, neighbour
+
+
+def bench_functions(storage, iterations):
+    results = {}
+    catalog = get_catalog(storage)
+    player_id, home, neighbour = bench_player(storage)
+    session = GameSession(storage=storage, verbose=False)
+    session.player_id = player_id
+    set_unfavorable_weather(session)
+
+    (lat1, lon1), (lat2, lon2) = catalog.position(home), catalog.position(neighbour)
+    results["calculate_distance"] = measure(lambda: calculate_distance(lat1, lon1, lat2, lon2), iterations)
+    results["get_airports_with_distances"] = measure(
+        lambda: get_airports_with_distances(session, player_id, limit=AIRPORT_LIST_LIMIT), iterations)
+
+    # Each call flies to the other airport, so every iteration is a real move
+    stops = [neighbour, home]
+    results["fly_to_airport"] = measure(
+        lambda: fly_to_airport(session, player_id, stops[session.state["end_location"] == neighbour]), iterations)
+    if session.state["end_location"] != home:
+        fly_to_airport(session, player_id, home)
+    results["buy_fuel"] = measure(lambda: buy_fuel(session, player_id, 1), iterations)
+    results["collect_cargo"] = measure(lambda: collect_cargo(session, player_id), iterations)
+    return results
+
+
+def bench_routes(storage, iterations):
+    import app as web  # imported late: module setup builds assets and tries MySQL once
+
+    web.storage = storage
+    client = web.app.test_client()
+    player_id, home, neighbour = bench_player(storage)
+    session = GameSession(storage=storage, verbose=False)
+    session.player_id = player_id
+    set_unfavorable_weather(session)
+    viewer_id = bench_player(storage, fuel=3000)[0]
+
+    def get(url):
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+
+    def post(url, body=None):
+        response = client.post(url, json=body or {})
+        assert response.status_code == 200, (url, response.status_code, response.get_json())
+
+    stops = [neighbour, home]
+    here = [home]
+
+    def fly():
+        target = stops[here[0] == neighbour]
+        post(f"/api/players/{player_id}/fly", {"airport": target})
+        here[0] = target
+
+    results = {}
+    for name, fn in (
+        ("GET /game", lambda: get(f"/game?player_id={player_id}")),
+        ("GET /api/players/<id>", lambda: get(f"/api/players/{player_id}")),
+        ("GET /api/players/<id>/airports", lambda: get(f"/api/players/{player_id}/airports?limit=20")),
+        ("GET /api/players/<id>/reachable", lambda: get(f"/api/players/{viewer_id}/reachable")),
+        ("POST /api/players/<id>/fly", fly),
+        ("POST /api/players/<id>/fuel", lambda: post(f"/api/players/{player_id}/fuel", {"amount": 1})),
+        ("GET /api/airports", lambda: get("/api/airports")),
+        ("GET /api/airports/tiles", lambda: get("/api/airports/tiles?bbox=-10,36,30,70&zoom=5")),
+    ):
+        results[name] = measure(fn, iterations)
+    if here[0] != home:
+        fly()
+    results["POST /api/players/<id>/cargo"] = measure(lambda: post(f"/api/players/{player_id}/cargo"), iterations)
+    return results
+
+
+def run(sizes, players, iterations, seed):
+    results = {}
+    for n in sizes:
+        conn = connect_local(airports=n, players=players, seed=seed)
+        storage = SQLStorage(conn)
+        invalidate_catalog()
+        invalidate_cargo_values()
+        results[str(n)] = {**bench_functions(storage, iterations), **bench_routes(storage, iterations)}
+        conn.close()
+    return results
+
+
+def compare(results, baseline, threshold, min_delta_us):
+    scale = results["calibration_us"] / baseline["calibration_us"]
+    regressions = []
+    for size, cases in results["results"].items():
+        for case, result in cases.items():
+            before = baseline["results"].get(size, {}).get(case)
+            if before is None:
+                continue
+            expected = before["median_us"] * scale
+            if result["median_us"] - expected > min_delta_us and result["median_us"] > expected * (1 + threshold):
+                regressions.append((size, case, expected, result["median_us"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="airports per seeded database")
+    parser.add_argument("--players", type=int, default=PLAYERS, help="seeded player rows per database")
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="write this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.5, help="allowed slowdown, 0.5 = 50%%")
+    parser.add_argument("--min-delta-us", type=float, default=5.0)
+    args = parser.parse_args()
+    if not args.save_baseline and not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline first")
+        sys.exit(2)
+
+    calibration = calibrate()
+    results = run(args.sizes, args.players, args.iterations, args.seed)
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "calibration_us": calibration,
+        "players": args.players,
+        "iterations": args.iterations,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'airports':>9}  {'case':<34} {'median us':>10} {'p95 us':>10}")
+    for size, cases in results.items():
+        for case, result in cases.items():
+            print(f"{size:>9}  {case:<34} {result['median_us']:>10.2f} {result['p95_us']:>10.2f}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(report, baseline, args.threshold, args.min_delta_us)
+    for size, case, expected, after in regressions:
+        print(f"REGRESSION {size:>7} airports  {case}: expected {expected:.2f} us, got {after:.2f} us")
+    if regressions:
+        sys.exit(1)
+    print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import threading
+
+
+class CargoValues:
+    def __init__(self, rows, version=0):
+        self.version = version
+        self.values = {code: value for code, value in rows}
+
+    @classmethod
+    def load(cls, storage, version=0):
+        return cls(storage.cargo_rows(), version=version)
+
+    def __contains__(self, airport_code):
+        return airport_code in self.values
+
+    def get(self, airport_code):
+        return self.values.get(airport_code)
+
+
+# Process-wide airport -> cargo value map, reused until invalidate_cargo_values() is called
+_cargo_values = None
+_cargo_version = 0
+_cargo_lock = threading.Lock()
+
+
+def get_cargo_values(storage):
+    global _cargo_values
+    cargo_values = _cargo_values
+    if cargo_values is not None:
+        return cargo_values
+    with _cargo_lock:
+        if _cargo_values is None:
+            _cargo_values = CargoValues.load(storage, version=_cargo_version)
+        return _cargo_values
+
+
+# Call after any write to goal or new_airports.goal_type
+def invalidate_cargo_values():
+    global _cargo_values, _cargo_version
+    with _cargo_lock:
+        _cargo_values = None
+        _cargo_version += 1
+
+
+# Settle many players' pickups in one batch; pickups are (player_id, airport_code).
+# Pickups at airports without cargo are skipped. Returns the number of rows updated.
+def settle_pickups(storage, pickups):
+    cargo_values = get_cargo_values(storage)
+    params = [(cargo_values.get(airport_code), player_id, airport_code)
+              for player_id, airport_code in pickups if airport_code in cargo_values]
+    if not params:
+        return 0
+    return storage.collect_many(params)
@@ -1,45 +1,255 @@
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
 import mysql.connector
+from mysql.connector.constants import ClientFlag
+
+from query_stats import InstrumentedConnection, QueryStats
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+Result = namedtuple("Result", ["rows", "rowcount", "lastrowid"])
+
 
 class Database:
-    def __init__(self, host, user, password, database):
+    def __init__(self, host, user, password, database, port=3306,
+                 pool_size=5, checkout_timeout=10.0, health_check_interval=30.0,
+                 slow_query_ms=None, slow_query_log=None, statements=None):
         self.host = host
+        self.port = port
         self.user = user
         self.password = password
         self.database = database
-        self.connection = None
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+
+        # Every statement on a pooled connection is timed and counted here
+        self.queries = QueryStats(slow_query_ms=slow_query_ms, slow_query_log=slow_query_log)
+
+        # Named statements run with run(); each is prepared once per pooled connection
+        self.statements = dict(statements or {})
+
+        self._idle = deque()  # (connection, time it was returned)
+        self._in_use = 0
+        self._opened = 0
+        self._lock = threading.Condition()
+        self._closed = False
+
+        # Pool usage stats
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._reconnects = 0
+        self._peak_in_use = 0
+
+    # FOUND_ROWS makes rowcount count matched rows, so a guarded UPDATE that
+    # changes nothing (a zero-cost purchase) still reports success as the other backends do.
+    # Autocommit lets run() send a single statement without a COMMIT round trip;
+    # cursor() opens an explicit transaction for its batches
+    def _open(self):
+        conn = mysql.connector.connect(
+            host=self.host,
+            port=self.port,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            client_flags=[ClientFlag.FOUND_ROWS],
+            autocommit=True
+        )
+        return InstrumentedConnection(conn, self.queries)
 
     def connect(self):
+        # Open one connection up front so a bad config fails at startup
         try:
-            self.connection = mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.database
-            )
-            print("Connection established")
+            conn = self._open()
         except mysql.connector.Error as err:
             print(f"Error: {err}")
+            return False
+        with self._lock:
+            self._closed = False
+            self._opened += 1
+            self._idle.append((conn, time.monotonic()))
+        print("Connection established")
+        return True
+
+    def _healthy(self, conn, returned_at):
+        if time.monotonic() - returned_at < self.health_check_interval:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except mysql.connector.Error:
+            return False
+
+    def checkout(self, timeout=None):
+        if timeout is None:
+            timeout = self.checkout_timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
 
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise ConnectionError("Database pool is closed")
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    break
+                if self._opened < self.pool_size:
+                    conn, returned_at = None, None
+                    self._opened += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"No connection available after {timeout:.1f}s")
+                waited = True
+                self._lock.wait(remaining)
+
+            self._in_use += 1
+            self._checkouts += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+            if waited:
+                wait = time.monotonic() - started
+                self._waits += 1
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+
+        # Connect and health check outside the lock so other threads are not blocked on I/O
+        try:
+            if conn is not None and not self._healthy(conn, returned_at):
+                self._discard(conn)
+                conn = None
+                with self._lock:
+                    self._reconnects += 1
+            if conn is None:
+                conn = self._open()
+        except mysql.connector.Error:
+            with self._lock:
+                self._opened -= 1
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+        return conn
+
+    def release(self, conn, broken=False):
+        if not broken:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except mysql.connector.Error:
+                broken = True
+
+        with self._lock:
+            self._in_use -= 1
+            if broken or self._closed:
+                self._opened -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+
+        if broken or self._closed:
+            self._discard(conn)
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except mysql.connector.Error:
+            pass
+
+    @contextmanager
+    def connection(self):
+        conn = self.checkout()
+        broken = False
+        try:
+            yield conn
+        except (mysql.connector.OperationalError, mysql.connector.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    # Hands each caller its own connection and cursor in one transaction; commits
+    # on success, release() rolls it back otherwise
+    @contextmanager
     def cursor(self, dictionary=False):
-        if not self.connection:
-            raise ConnectionError("Database not connected")
-        return self.connection.cursor(dictionary=dictionary)
+        with self.connection() as conn:
+            conn.start_transaction()
+            cursor = conn.cursor(dictionary=dictionary)
+            try:
+                yield cursor
+                conn.commit()
+            finally:
+                cursor.close()
+
+    def register(self, name, sql):
+        self.statements[name] = sql
+
+    # Runs a registered statement with binary-protocol parameters. The prepared
+    # cursor is kept on the connection and reused while it lives; a reconnect
+    # opens a new connection with no cursors, so statements are prepared again.
+    # The statement commits on its own (autocommit), so a call costs the
+    # connector's COM_STMT_RESET plus the execute, with no COMMIT after it
+    def run(self, name, params=(), dictionary=False):
+        sql = self.statements[name]
+        with self.connection() as conn:
+            cursor = conn.prepared.get((name, dictionary))
+            if cursor is None:
+                cursor = conn.prepared[(name, dictionary)] = conn.cursor(prepared=True, dictionary=dictionary)
+            try:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall() if cursor.description else None
+            except mysql.connector.Error:
+                # Drop the cursor so the statement is prepared afresh next time
+                conn.prepared.pop((name, dictionary), None)
+                try:
+                    cursor.close()
+                except mysql.connector.Error:
+                    pass
+                raise
+            finally:
+                cursor.done()
+            return Result(rows, cursor.rowcount, cursor.lastrowid)
 
     def execute_query(self, query, params=None):
-        cursor = self.cursor()
         try:
-            cursor.execute(query, params)
-            return cursor.fetchall()
+            with self.cursor() as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchall()
         except mysql.connector.Error as err:
             print(f"Error: {err}")
             return None
-        finally:
-            cursor.close()
 
-    def commit(self):
-        if self.connection:
-            self.connection.commit()
+    def stats(self):
+        with self._lock:
+            return {
+                "pool_size": self.pool_size,
+                "open": self._opened,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "peak_in_use": self._peak_in_use,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_avg_ms": (self._wait_total / self._waits * 1000) if self._waits else 0.0,
+                "wait_max_ms": self._wait_max * 1000,
+                "timeouts": self._timeouts,
+                "reconnects": self._reconnects,
+            }
 
     def close(self):
-        if self.connection:
-            self.connection.close()
\ No newline at end of file
+        with self._lock:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._opened -= len(idle)
+            self._lock.notify_all()
+        for conn in idle:
+            self._discard(conn)
@@ -0,0 +1,203 @@
+# Append-only log of game actions (start, weather, fly, buy, collect) in JSONL
+# segments, plus a replay tool that rebuilds player snapshots from it.
+#
+# Appends only go into a buffer; a writer thread writes and fsyncs whatever has
+# accumulated every group_commit_interval seconds (group commit), so many
+# actions share one sequential write. append(..., wait=True) blocks until the
+# event is durable. Segments roll over at segment_bytes.
+#
+#   python events.py replay LOG_DIR [--output snapshots.json] [--mysql]
+import argparse
+import json
+import os
+import threading
+import time
+
+SEGMENT_PREFIX = "events-"
+SEGMENT_SUFFIX = ".jsonl"
+
+
+def segment_number(name):
+    number = name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]
+    if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX) and number.isdigit():
+        return int(number)
+    return None
+
+
+# Segment files in log order; numbers may have gaps
+def segment_paths(directory):
+    numbered = [(segment_number(name), name) for name in os.listdir(directory)]
+    return [os.path.join(directory, name) for number, name in sorted(numbered) if number is not None]
+
+
+# Cuts a torn last line (a crash mid-write) off the end of a segment, so the next
+# append starts on a line of its own. Returns the bytes dropped
+def truncate_torn_tail(path, chunk_size=64 * 1024):
+    with open(path, "r+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        end = size
+        while end > 0:
+            start = max(end - chunk_size, 0)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        if end < size:
+            f.truncate(end)
+    return size - end
+
+
+class EventLog:
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, group_commit_interval=0.005, fsync=True):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.group_commit_interval = group_commit_interval
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+
+        numbers = [segment_number(name) for name in os.listdir(directory)]
+        self._segment = max((number for number in numbers if number is not None), default=1)
+        if os.path.exists(self._segment_path()):
+            dropped = truncate_torn_tail(self._segment_path())
+            if dropped:
+                print(f"Event log: dropped {dropped} bytes of a torn write at the end of {self._segment_path()}")
+        self._file = open(self._segment_path(), "ab")
+
+        self._buffer = []
+        self._appended = 0  # sequence number of the last buffered event
+        self._durable = 0  # sequence number of the last event on disk
+        self._cond = threading.Condition()
+        self._closed = False
+        self.commits = 0
+        self.events_written = 0
+
+        self._thread = threading.Thread(target=self._run, name="event-log-writer", daemon=True)
+        self._thread.start()
+
+    def _segment_path(self):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{self._segment:06d}{SEGMENT_SUFFIX}")
+
+    def append(self, event, player_id, wait=False, **fields):
+        line = json.dumps({"ts": round(time.time(), 6), "e": event, "p": player_id, **fields},
+                          separators=(",", ":")).encode() + b"\n"
+        with self._cond:
+            if self._closed:
+                raise ValueError("Event log is closed")
+            self._buffer.append(line)
+            self._appended += 1
+            seq = self._appended
+            if wait:
+                self._cond.notify_all()
+                while self._durable < seq:
+                    self._cond.wait()
+        return seq
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed:
+                    self._cond.wait(self.group_commit_interval)  # a waiting append wakes this early
+                batch, self._buffer = self._buffer, []
+                seq = self._appended
+                closed = self._closed
+            if batch:
+                self._write(batch)
+            with self._cond:
+                self._durable = seq
+                self._cond.notify_all()
+            if closed and not batch:
+                return
+
+    def _write(self, batch):
+        data = b"".join(batch)
+        self._file.write(data)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.commits += 1
+        self.events_written += len(batch)
+        if self._file.tell() >= self.segment_bytes:
+            self._file.close()
+            self._segment += 1
+            self._file = open(self._segment_path(), "ab")
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._file.close()
+
+
+def read_events(directory):
+    for path in segment_paths(directory):
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # torn write; EventLog cuts it off on reopen, older logs may have one mid-file
+
+
+# Rebuilds {player_id: snapshot} from the log, applying events in order
+def replay(directory):
+    players = {}
+    for event in read_events(directory):
+        kind = event["e"]
+        player_id = event["p"]
+        if kind == "start":
+            players[player_id] = {
+                "player_id": player_id, "screen_name": event["name"], "fuel_amount": event["fuel"],
+                "total_money": event["money"], "cargo_collected": 0, "end_location": event["location"],
+                "weather": [],
+            }
+            continue
+        player = players.get(player_id)
+        if player is None:
+            continue  # started before the log began
+        if kind == "weather":
+            player["weather"] = event["airports"]
+        elif kind == "fly":
+            player["fuel_amount"] -= event["fuel"]
+            player["end_location"] = event["to"]
+        elif kind == "buy":
+            player["fuel_amount"] += event["fuel"]
+            player["total_money"] -= event["cost"]
+        elif kind == "collect":
+            player["total_money"] += event["value"]
+            player["cargo_collected"] += 1
+    return players
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+    replay_parser = sub.add_parser("replay", help="rebuild player snapshots from a log directory")
+    replay_parser.add_argument("directory")
+    replay_parser.add_argument("--output", help="write snapshots as JSON here instead of stdout")
+    replay_parser.add_argument("--mysql", action="store_true", help="write snapshots back to the player table")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"Error: no event log at {args.directory}")
+        return
+    players = replay(args.directory)
+    if args.mysql:
+        from python import connect_to_db
+        from storage import SQLStorage
+        conn = connect_to_db()
+        if conn:
+            SQLStorage(conn).save_players(list(players.values()))
+            conn.close()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(list(players.values()), f)
+    else:
+        for player in players.values():
+            print(json.dumps(player))
+
+
+if __name__ == "__main__":
+    main()
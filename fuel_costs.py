@@ -0,0 +1,146 @@
+# Fuel needed from a player's current airport to every airport, with the
+# player's bad-weather multiplier already applied. Built when the weather is
+# rolled and then kept in step: a move recomputes the one distance row, a
+# weather change only touches the airports that entered or left bad weather.
+# Moves, listings and the reachability query read from it instead of
+# recomputing distances and weather per target. The reachability query only
+# looks at the candidates a cached radius query on the catalog's spatial index
+# returns for the player's fuel, not at every airport.
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from planner import FUEL_PER_KM
+from weather import HIGH_CONSUMPTION, weather
+
+FUEL_BUCKET = 100  # fuel units per candidate cache bucket
+
+
+# Catalog indexes of the airports within reach of the top of a fuel bucket,
+# nearest first, ignoring weather (bad weather only raises the fuel needed).
+# Cached per (location, fuel bucket) and shared by every player
+class ReachCandidates:
+    def __init__(self, catalog, cache_size=4096):
+        self.catalog = catalog
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, location, fuel):
+        key = (location, int(fuel) // FUEL_BUCKET)
+        with self._lock:
+            idx = self._cache.get(key)
+            if idx is not None:
+                self._cache.move_to_end(key)
+                return idx
+        radius = (key[1] + 1) * FUEL_BUCKET / FUEL_PER_KM
+        index = self.catalog.index
+        idx = np.array([index[code] for code, _, _ in self.catalog.within(location, radius) if code != location],
+                       dtype=np.intp)
+        with self._lock:
+            self._cache[key] = idx
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return idx
+
+
+class FuelCostTable:
+    def __init__(self, catalog, location, bad_airports=frozenset(), weather_epoch=0, candidates=None):
+        self.catalog = catalog
+        self.candidates = candidates or ReachCandidates(catalog)
+        self.bad_airports = frozenset()
+        self.weather_epoch = weather_epoch
+        self.lock = threading.Lock()  # serialises updates; readers use the current row
+        # (location, distance, multiplier, fuel), replaced as a whole on every update
+        self.row = (None, None, np.ones(len(catalog)), None)
+        self.move(location)
+        self.set_weather(bad_airports, weather_epoch)
+
+    @property
+    def location(self):
+        return self.row[0]
+
+    def move(self, location):
+        with self.lock:
+            multiplier = self.row[2]
+            distance = np.asarray(self.catalog.distances(location), dtype=np.float64)
+            self.row = (location, distance, multiplier, (FUEL_PER_KM * distance * multiplier).astype(int))
+
+    def set_weather(self, bad_airports, weather_epoch):
+        bad_airports = frozenset(code for code in bad_airports if code in self.catalog)
+        with self.lock:
+            location, distance, multiplier, fuel = self.row
+            changed = [self.catalog.index[code] for code in bad_airports ^ self.bad_airports]
+            if changed:
+                multiplier = multiplier.copy()
+                fuel = fuel.copy()
+                for i in changed:
+                    multiplier[i] = HIGH_CONSUMPTION if self.catalog.codes[i] in bad_airports else 1.0
+                fuel[changed] = (FUEL_PER_KM * distance[changed] * multiplier[changed]).astype(int)
+                self.row = (location, distance, multiplier, fuel)
+            self.bad_airports = bad_airports
+            self.weather_epoch = weather_epoch
+
+    # (origin, distance_km, fuel_needed) for one flight, read from a single row
+    def leg(self, code):
+        location, distance, _, fuel = self.row
+        i = self.catalog.index[code]
+        return location, float(distance[i]), int(fuel[i])
+
+    # (airport_code, airport_name, distance_km, fuel_needed) for every airport the fuel covers, nearest first
+    def reachable(self, fuel):
+        if fuel < 0:
+            return []
+        location, distance, _, fuel_needed = self.row
+        idx = self.candidates.get(location, fuel)
+        idx = idx[fuel_needed[idx] <= fuel]
+        catalog = self.catalog
+        return [(catalog.codes[i], catalog.names[i], float(distance[i]), int(fuel_needed[i])) for i in idx]
+
+
+# Tables per player, like the weather map; least recently used players are dropped
+class FuelCosts:
+    def __init__(self, max_players=4096):
+        self.max_players = max_players
+        self._tables = OrderedDict()
+        self._candidates = None
+        self._lock = threading.Lock()
+
+    def _candidates_for(self, catalog):
+        with self._lock:
+            if self._candidates is None or self._candidates.catalog is not catalog:
+                self._candidates = ReachCandidates(catalog)
+            return self._candidates
+
+    def build(self, player_id, catalog, location):
+        table = FuelCostTable(catalog, location, weather.airports(player_id), weather.epoch(player_id),
+                              self._candidates_for(catalog))
+        with self._lock:
+            self._tables[player_id] = table
+            self._tables.move_to_end(player_id)
+            if len(self._tables) > self.max_players:
+                self._tables.popitem(last=False)
+        return table
+
+    # Table for the player at `location`, brought up to date with moves and weather made elsewhere
+    def table(self, player_id, catalog, location):
+        with self._lock:
+            table = self._tables.get(player_id)
+            if table is not None:
+                self._tables.move_to_end(player_id)
+        if table is None or table.catalog is not catalog:
+            return self.build(player_id, catalog, location)
+        if table.location != location:
+            table.move(location)
+        epoch = weather.epoch(player_id)
+        if table.weather_epoch != epoch:
+            table.set_weather(weather.airports(player_id), epoch)
+        return table
+
+    def clear(self, player_id):
+        with self._lock:
+            self._tables.pop(player_id, None)
+
+
+fuel_costs = FuelCosts()
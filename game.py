@@ -1,7 +1,11 @@
-import random
 import mysql.connector
+from mysql.connector.constants import ClientFlag
 from math import radians, sin, cos, sqrt, atan2
 
+import python
+from python import GameSession
+from storage import SQLStorage
+
 class Database:
     def __init__(self, host, port, user, password, database):
         self.host = host
@@ -19,7 +23,8 @@ class Database:
                 user=self.user,
                 password=self.password,
                 database=self.database,
-                autocommit=True
+                autocommit=True,
+                client_flags=[ClientFlag.FOUND_ROWS]  # rowcount = matched rows, see storage.py
             )
             if self.conn.is_connected():
                 print("Connection Established")
@@ -33,37 +38,20 @@ class Database:
             self.conn.close()
 
 class Game:
-    def __init__(self):
+    # storage is any storage.Storage backend; by default one MySQL connection for the game
+    def __init__(self, storage=None):
         self.db = Database('localhost', 3306, 'root', '12345', 'flight_path')
+        if storage is None:
+            conn = self.db.connect()
+            storage = SQLStorage(conn) if conn else None
+        self.session = GameSession(storage=storage)
         self.player_id = None
 
     def start_game(self):
-        conn = self.db.connect()
-        if not conn:
+        if not self.session.storage:
             print("Database connection failed.")
             return
-
-        cursor = conn.cursor()
-        try:
-            player_name = input("Enter your name: ")
-            print(f"Welcome, {player_name}!")
-            cursor.execute(
-                """
-                INSERT INTO player (
-                    screen_name, fuel_amount, total_money, cargo_collected, 
-                    start_location, destination, end_location
-                ) 
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """,
-                (player_name, 3000, 0, 0, 'LEMD', 'LIPE', 'LEMD')
-            )
-            conn.commit()
-            cursor.execute("SELECT LAST_INSERT_ID()")
-            self.player_id = int(cursor.fetchone()[0])
-            print(f"Player created with ID: {self.player_id}")
-        finally:
-            cursor.close()
-            self.db.close()
+        self.player_id = python.start_game(self.session)
 
     def calculate_distance(self, lat1, lon1, lat2, lon2):
         R = 6371  # Earth radius in kilometers
@@ -73,109 +61,19 @@ class Game:
         c = 2 * atan2(sqrt(a), sqrt(1 - a))
         return R * c
 
-    def get_airports_with_distances(self):
-        conn = self.db.connect()
-        if not conn:
-            print("Database connection failed.")
-            return
-
-        cursor = conn.cursor(dictionary=True)
-        try:
-            cursor.execute(
-                """
-                SELECT end_location, latitude_deg, longitude_deg
-                FROM player
-                JOIN new_airports ON player.end_location = new_airports.airport_code
-                WHERE player.player_id = %s
-                """,
-                (self.player_id,)
-            )
-            player_location = cursor.fetchone()
-
-            if not player_location:
-                print(f"No location data found for player_id {self.player_id}.")
-                return
-
-            end_lat = float(player_location["latitude_deg"])
-            end_lon = float(player_location["longitude_deg"])
-
-            cursor.execute("SELECT airport_code, airport_name, latitude_deg, longitude_deg FROM new_airports")
-            airports = cursor.fetchall()
-
-            airport_distances = []
-            for airport in airports:
-                lat = float(airport["latitude_deg"])
-                lon = float(airport["longitude_deg"])
-                distance = self.calculate_distance(end_lat, end_lon, lat, lon)
-                airport_distances.append((airport["airport_code"], airport["airport_name"], distance))
-
-            airport_distances.sort(key=lambda x: x[2])
-            print(f"Distances from {player_location['end_location']} to other airports:")
-            for code, name, dist in airport_distances:
-                print(f"{code}: {dist:.2f} km")
-        finally:
-            cursor.close()
-            self.db.close()
+    def get_airports_with_distances(self, limit=None):
+        return python.get_airports_with_distances(self.session, self.player_id, limit=limit)
 
     def set_unfavorable_weather(self):
-        conn = self.db.connect()
-        if not conn:
-            print("Database connection failed.")
-            return
-
-        cursor = conn.cursor()
-        try:
-            cursor.execute("SELECT airport_code FROM new_airports")
-            airport_codes = [row[0] for row in cursor.fetchall()]
-
-            unfavorable_airports = random.sample(airport_codes, 3)
-            cursor.executemany(
-                "UPDATE new_airports SET high_consumption = 1 WHERE airport_code = %s",
-                [(airport,) for airport in unfavorable_airports]
-            )
-            conn.commit()
-
-            cursor.execute(
-                "SELECT airport_code, airport_name FROM new_airports WHERE high_consumption = 1"
-            )
-            print("Airports with unfavorable weather:")
-            for airport in cursor.fetchall():
-                print(f" - {airport[0]} ({airport[1]}) - Fuel consumption increased by 60%")
-        finally:
-            cursor.close()
-            self.db.close()
+        return python.set_unfavorable_weather(self.session)
 
     def buy_fuel(self, fuel_amount):
-        conn = self.db.connect()
-        if not conn:
-            print("Database connection failed.")
-            return
-
-        cursor = conn.cursor()
-        try:
-            cost = fuel_amount * 5
-            cursor.execute("SELECT total_money FROM player WHERE player_id = %s", (self.player_id,))
-            money = cursor.fetchone()[0]
-
-            if money >= cost:
-                cursor.execute(
-                    """
-                    UPDATE player 
-                    SET total_money = total_money - %s, fuel_amount = fuel_amount + %s 
-                    WHERE player_id = %s
-                    """,
-                    (cost, fuel_amount, self.player_id)
-                )
-                conn.commit()
-                print(f"Bought {fuel_amount} fuel units for {cost} money.")
-            else:
-                print("Not enough money to buy fuel.")
-        finally:
-            cursor.close()
-            self.db.close()
+        return python.buy_fuel(self.session, self.player_id, fuel_amount)
 
     def main_menu(self):
         self.start_game()
+        if not self.player_id:
+            return
         self.set_unfavorable_weather()
 
         while True:
@@ -199,3 +97,4 @@ class Game:
 if __name__ == "__main__":
     game = Game()
     game.main_menu()
+    game.db.close()
@@ -0,0 +1,275 @@
+# Top players by money, by cargo collected and by fastest win.
+#
+# Each board holds a window of its best players (10 x K by default) in a sorted
+# list (bisect on (key, player_id) tuples), so an update is a binary search plus
+# a list shift and the top K is a slice. Every player outside the window ranks
+# at or after the board's floor: a player who drops to the floor leaves the
+# window, one who climbs above it joins with the totals the action reports, and
+# a window left with fewer than K players is refilled from storage with an
+# indexed LIMIT query. Memory and startup cost depend on K, not on the players.
+#
+# Only this process's actions are seen. With several workers each one's boards
+# lag the others until its next refill or restart, and the fastest board is per
+# process outright: win times are measured here from start_game to the win, so a
+# game started in another worker or before a restart wins untimed. Start times
+# of games that never end expire after max_game_seconds.
+import json
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from assets import Asset
+
+BOARDS = ("money", "cargo", "fastest")
+
+
+# A player's sort key on a board, best first; None keeps them off it
+def board_key(board, player):
+    if board == "money":
+        return -player["total_money"]
+    if board == "cargo":
+        return -player["cargo_collected"]
+    return player["won_seconds"]
+
+
+class Board:
+    def __init__(self, window, floor=None):
+        self.window = window
+        self.floor = floor  # (sort key, player_id) no outside player ranks before; None when nobody is outside
+        self._keys = []  # (sort key, player_id), best first
+        self._key_of = {}
+
+    # Places the player and returns (old rank, new rank, player_id pushed out of the window);
+    # ranks are None when the player is not in the window
+    def set(self, player_id, sort_key):
+        old = self.remove(player_id)
+        entry = (sort_key, player_id)
+        if sort_key is None or (self.floor is not None and entry >= self.floor):
+            return old, None, None
+        insort(self._keys, entry)
+        self._key_of[player_id] = entry
+        if len(self._keys) <= self.window:
+            return old, bisect_left(self._keys, entry), None
+        self.floor = self._keys.pop()
+        del self._key_of[self.floor[1]]
+        if self.floor == entry:
+            return old, None, None
+        return old, bisect_left(self._keys, entry), self.floor[1]
+
+    def remove(self, player_id):
+        entry = self._key_of.pop(player_id, None)
+        if entry is None:
+            return None
+        rank = bisect_left(self._keys, entry)
+        del self._keys[rank]
+        return rank
+
+    # Fewer than k players known to be ahead of everyone outside
+    def short(self, k):
+        return self.floor is not None and len(self._keys) < k
+
+    def top(self, k):
+        return [player_id for _, player_id in self._keys[:k]]
+
+    def __contains__(self, player_id):
+        return player_id in self._key_of
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class Leaderboard:
+    def __init__(self, size=10, window=None, max_game_seconds=24 * 3600):
+        self.size = size
+        self.window = window or size * 10
+        self.max_game_seconds = max_game_seconds
+        self.storage = None
+        self.players = {}  # player_id -> {"screen_name", "total_money", "cargo_collected", "won_seconds"}, windows only
+        self.boards = {name: Board(self.window) for name in BOARDS}
+        self.version = 0
+        self.refills = 0
+        self._started = OrderedDict()  # player_id -> time.monotonic() at start_game, oldest first
+        self._asset = None
+        self._asset_version = -1
+        self._refilling = False
+        self._touched = None  # player_id -> totals or None, changes seen while a refill query runs
+        self._lock = threading.Lock()
+
+    def _remember(self, player_id, screen_name, total_money, cargo_collected, won_seconds):
+        self.players[player_id] = {"screen_name": screen_name, "total_money": total_money,
+                                   "cargo_collected": cargo_collected, "won_seconds": won_seconds}
+
+    # Re-ranks the player on every board and forgets whoever is left in no window
+    def _place(self, player_id):
+        player = self.players[player_id]
+        moved = False
+        unplaced = [player_id]
+        for name, board in self.boards.items():
+            old, new, pushed_out = board.set(player_id, board_key(name, player))
+            moved = moved or any(rank is not None and rank < self.size for rank in (old, new))
+            if pushed_out is not None:
+                unplaced.append(pushed_out)
+        if moved:
+            self.version += 1
+        for other in unplaced:
+            if not any(other in board for board in self.boards.values()):
+                self.players.pop(other, None)
+
+    # Best window + 1 rows for a board: the window and, if there is one more, the floor
+    def _query(self, name):
+        rows = self.storage.leaderboard_rows(name, self.window + 1)
+        floor = None
+        if len(rows) > self.window:
+            player_id, screen_name, total_money, cargo_collected, won_seconds = rows.pop()
+            floor = (board_key(name, {"total_money": total_money, "cargo_collected": cargo_collected,
+                                      "won_seconds": won_seconds}), player_id)
+        return rows, floor
+
+    def _load(self, loaded):
+        for rows, _ in loaded:
+            for row in rows:
+                self._remember(*row)
+                self._place(row[0])
+        self.version += 1
+
+    def rebuild(self, storage):
+        with self._lock:
+            self.storage = storage
+            loaded = [self._query(name) for name in BOARDS]
+            self.players = {}
+            self.boards = {name: Board(self.window, floor) for name, (_, floor) in zip(BOARDS, loaded)}
+            self._load(loaded)
+
+    # Reloads boards whose window ran below K. The queries run outside the lock, one
+    # refill at a time, and each board is swapped in afterwards (_swap)
+    def _refill(self):
+        with self._lock:
+            if self.storage is None or self._refilling:
+                return
+            short = [name for name, board in self.boards.items() if board.short(self.size)]
+            if not short:
+                return
+            self._refilling = True
+        try:
+            for name in short:
+                with self._lock:
+                    self._touched = {}
+                rows, floor = self._query(name)
+                with self._lock:
+                    self._swap(name, rows, floor)
+                    self._touched = None
+        finally:
+            with self._lock:
+                self._refilling = False
+                self._touched = None
+
+    # Live totals win over the rows read, which may predate actions seen while the
+    # query ran. If a row belongs to a player who spent meanwhile without this
+    # process knowing their totals, the rows are stale: the board stays short and
+    # the next read refills it again
+    def _swap(self, name, rows, floor):
+        unknown = {player_id for player_id, player in self._touched.items() if player is None}
+        if any(row[0] in unknown for row in rows) or (floor is not None and floor[1] in unknown):
+            return
+        old = self.boards[name]
+        self.boards[name] = Board(self.window, floor)
+        for player_id, player in self._touched.items():
+            if player is not None:
+                self.players.setdefault(player_id, player)
+        for row in rows:
+            if row[0] not in self.players:
+                self._remember(*row)
+            self._place(row[0])
+        for player_id in set(old.top(self.window)) | set(self._touched):
+            if player_id in self.players:
+                self._place(player_id)
+        self.version += 1
+        self.refills += 1
+
+    # Notes a change while a refill query runs: the player's totals, or None when
+    # they are not known here (spending by a player outside every window)
+    def _touch(self, player_id):
+        if self._touched is not None:
+            self._touched[player_id] = self.players.get(player_id)
+
+    def player_started(self, player_id, screen_name):
+        now = time.monotonic()
+        with self._lock:
+            while self._started and now - next(iter(self._started.values())) > self.max_game_seconds:
+                self._started.popitem(last=False)
+            self._started[player_id] = now
+            self._remember(player_id, screen_name, 0, 0, None)
+            self._touch(player_id)
+            self._place(player_id)
+
+    # Spending only lowers a player, so players outside every window stay outside
+    def spent(self, player_id, cost):
+        with self._lock:
+            player = self.players.get(player_id)
+            if player is not None:
+                player["total_money"] -= cost
+            self._touch(player_id)
+            if player is not None:
+                self._place(player_id)
+
+    # Totals after a collection, from the session's player snapshot
+    def collected(self, state):
+        with self._lock:
+            player = self.players.get(state["player_id"])
+            won_seconds = player["won_seconds"] if player else None
+            self._remember(state["player_id"], state["screen_name"], state["total_money"],
+                           state["cargo_collected"], won_seconds)
+            self._touch(state["player_id"])
+            self._place(state["player_id"])
+
+    # Records the win and returns its time in seconds, or None if the start was not seen here
+    def player_won(self, state):
+        player_id = state["player_id"]
+        with self._lock:
+            started = self._started.pop(player_id, None)
+            if started is None:
+                return None
+            won_seconds = round(time.monotonic() - started)
+            self._remember(player_id, state["screen_name"], state["total_money"], state["cargo_collected"],
+                           won_seconds)
+            self._touch(player_id)
+            self._place(player_id)
+            return won_seconds
+
+    def game_ended(self, player_id):
+        with self._lock:
+            self._started.pop(player_id, None)
+
+    def _top(self, k):
+        result = {}
+        for name in BOARDS:
+            result[name] = [{"player_id": player_id, **self.players[player_id]}
+                            for player_id in self.boards[name].top(k)]
+        return result
+
+    # O(K): slices of the sorted boards
+    def top(self, k=None):
+        k = self.size if k is None else min(k, self.size)
+        self._refill()
+        with self._lock:
+            return self._top(k)
+
+    # Encoded top-K document, rebuilt only when the version has moved
+    def asset(self):
+        self._refill()
+        with self._lock:
+            if self._asset_version == self.version:
+                return self._asset
+            version = self.version
+            document = {"version": version, **self._top(self.size)}
+        data = json.dumps(document, separators=(",", ":"), ensure_ascii=False).encode()
+        asset = Asset("leaderboard.json", data)
+        with self._lock:
+            if version >= self._asset_version:
+                self._asset = asset
+                self._asset_version = version
+        return asset
+
+
+leaderboard = Leaderboard()
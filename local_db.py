@@ -0,0 +1,164 @@
+# In-process stand-in for the MySQL flight_path database, backed by sqlite3.
+# SCHEMA mirrors the tables and indexes schema.py migrates MySQL to.
+# It speaks the subset of the mysql.connector API the game uses (%s parameters,
+# dictionary cursors, rowcount, lastrowid), so game code runs against it unchanged.
+import random
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE goal (
+    goal_id INTEGER PRIMARY KEY,
+    name TEXT,
+    value INTEGER NOT NULL
+);
+CREATE TABLE new_airports (
+    airport_code TEXT PRIMARY KEY,
+    airport_name TEXT NOT NULL,
+    latitude_deg REAL NOT NULL,
+    longitude_deg REAL NOT NULL,
+    goal_type INTEGER REFERENCES goal(goal_id),
+    high_consumption INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE player (
+    player_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    screen_name TEXT,
+    start_location TEXT,
+    end_location TEXT,
+    destination TEXT,
+    total_money INTEGER NOT NULL DEFAULT 0,
+    cargo_collected INTEGER NOT NULL DEFAULT 0,
+    fuel_amount INTEGER NOT NULL DEFAULT 0,
+    won_seconds INTEGER NULL
+);
+CREATE INDEX idx_new_airports_goal_type ON new_airports (goal_type);
+CREATE INDEX idx_player_money ON player (total_money DESC, player_id);
+CREATE INDEX idx_player_cargo ON player (cargo_collected DESC, player_id);
+CREATE INDEX idx_player_won_seconds ON player (won_seconds, player_id);
+"""
+
+# The two airports the game logic names explicitly
+FIXED_AIRPORTS = [
+    ("LEMD", "Adolfo Suárez Madrid–Barajas Airport", 40.471926, -3.56264),
+    ("LIPE", "Bologna Guglielmo Marconi Airport", 44.5354, 11.2887),
+]
+
+
+class LocalCursor:
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {column[0]: value for column, value in zip(self._cursor.description, row)}
+
+    def execute(self, query, params=None):
+        self._cursor.execute(query.replace("%s", "?"), params or ())
+
+    def executemany(self, query, seq_params):
+        self._cursor.executemany(query.replace("%s", "?"), seq_params)
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+class LocalConnection:
+    def __init__(self, path=":memory:"):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+
+    # prepared is accepted for mysql.connector compatibility; sqlite caches statements itself
+    def cursor(self, dictionary=False, prepared=False):
+        return LocalCursor(self._db.cursor(), dictionary=dictionary)
+
+    @property
+    def in_transaction(self):
+        return self._db.in_transaction
+
+    def is_connected(self):
+        return True
+
+    def ping(self, reconnect=False):
+        pass
+
+    def executescript(self, script):
+        self._db.executescript(script)
+
+    def commit(self):
+        self._db.commit()
+
+    def rollback(self):
+        self._db.rollback()
+
+    def close(self):
+        self._db.close()
+
+
+# Synthetic goal, airport and player rows: airports scattered around Europe plus
+# the fixed start and destination, with cargo at roughly cargo_share of them
+def synthetic_data(airports=50, players=0, goals=5, cargo_share=0.7, seed=42):
+    rng = random.Random(seed)
+    goal_rows = [(goal_id, f"Cargo {goal_id}", 100 * goal_id) for goal_id in range(1, goals + 1)]
+
+    rows = list(FIXED_AIRPORTS)
+    for i in range(max(airports - len(rows), 0)):
+        rows.append((f"X{i:05d}", f"Synthetic Airport {i}", rng.uniform(36, 70), rng.uniform(-10, 30)))
+    airport_rows = [row + ((rng.randint(1, goals) if rng.random() < cargo_share else None),) for row in rows]
+
+    codes = [row[0] for row in rows]
+    player_rows = [(f"player{i}", rng.randint(0, 3000), rng.randint(0, 5000), rng.randint(0, 8),
+                    'LEMD', 'LIPE', rng.choice(codes)) for i in range(players)]
+    return goal_rows, airport_rows, player_rows
+
+
+# Fills an empty stand-in with the schema and synthetic rows
+def seed(conn, **options):
+    goal_rows, airport_rows, player_rows = synthetic_data(**options)
+    conn.executescript(SCHEMA)
+    cursor = conn.cursor()
+    try:
+        cursor.executemany("INSERT INTO goal (goal_id, name, value) VALUES (%s, %s, %s)", goal_rows)
+        cursor.executemany(
+            """
+            INSERT INTO new_airports (airport_code, airport_name, latitude_deg, longitude_deg, goal_type)
+            VALUES (%s, %s, %s, %s, %s)
+            """,
+            airport_rows
+        )
+        cursor.executemany(
+            """
+            INSERT INTO player (
+                screen_name, fuel_amount, total_money, cargo_collected,
+                start_location, destination, end_location
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """,
+            player_rows
+        )
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def connect_local(path=":memory:", **seed_options):
+    conn = LocalConnection(path)
+    seed(conn, **seed_options)
+    return conn
@@ -0,0 +1,215 @@
+# Route planner: cheapest fuel- and money-feasible route that collects the
+# remaining cargo and ends at the destination.
+#
+# The search is A* over (airport, visited cargo airports, cargo count) with
+# fuel and money carried along; fuel is bought just in time on each leg, so
+# minimising fuel burned also minimises money spent. Cargo is collected on
+# arrival, up to max_pickups per airport (the game allows repeat pickups).
+# Only the `candidates` cargo airports with the smallest detour
+# d(start, a) + d(a, destination) are considered; with a small N that is the
+# whole problem, for a large catalog it is the heuristic cut. A greedy route
+# seeds the incumbent so the search can stop at its time budget with a
+# feasible answer.
+import heapq
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from airports import get_catalog
+from cargo import get_cargo_values
+from weather import HIGH_CONSUMPTION
+
+FUEL_PER_KM = 0.5
+FUEL_PRICE = 5
+
+
+class RoutePlanner:
+    def __init__(self, catalog, cargo_values, destination, goal, candidates=12,
+                 time_budget=0.05, max_pickups=None, cache_size=4096):
+        self.catalog = catalog
+        self.cargo_values = cargo_values
+        self.destination = destination
+        self.goal = goal
+        self.candidates = candidates
+        self.time_budget = time_budget
+        self.max_pickups = goal if max_pickups is None else max_pickups
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._cargo_codes = [code for code in catalog.codes if code in cargo_values]
+        self._cargo_idx = np.array([catalog.index[code] for code in self._cargo_codes], dtype=np.intp)
+        self.hits = 0
+        self.misses = 0
+
+    # Cached entry point; weather is the set of bad-weather airport codes
+    def suggest(self, location, fuel, money, cargo, weather=frozenset()):
+        key = (location, fuel, money, cargo, frozenset(weather), self.catalog.version)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+        plan = self.plan(location, fuel, money, cargo, weather)
+        with self._lock:
+            self._cache[key] = plan
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return plan
+
+    # Distances come from catalog.distances(), the rows FuelCostTable charges
+    # flights from, so planned leg fuel is exactly what fly_to_airport takes
+    def _nodes(self, location):
+        catalog = self.catalog
+        nodes = [location]
+        if len(self._cargo_idx):
+            detour = (np.asarray(catalog.distances(location), dtype=np.float64)[self._cargo_idx]
+                      + np.asarray(catalog.distances(self.destination), dtype=np.float64)[self._cargo_idx])
+            k = min(self.candidates, len(detour))
+            best = np.argpartition(detour, k - 1)[:k] if k < len(detour) else np.arange(len(detour))
+            nodes += [self._cargo_codes[i] for i in best[np.argsort(detour[best])] if self._cargo_codes[i] != location]
+        if self.destination not in nodes:
+            nodes.append(self.destination)
+        idx = np.array([catalog.index[code] for code in nodes], dtype=np.intp)
+        distance = np.array([np.asarray(catalog.distances(code), dtype=np.float64)[idx] for code in nodes])
+        return nodes, distance
+
+    def plan(self, location, fuel, money, cargo, weather=frozenset()):
+        if location not in self.catalog or self.destination not in self.catalog:
+            return None
+        started = time.perf_counter()
+        nodes, distance = self._nodes(location)
+        n = len(nodes)
+        dest = nodes.index(self.destination)
+        multiplier = np.array([HIGH_CONSUMPTION if code in weather else 1.0 for code in nodes])
+        weighted = FUEL_PER_KM * distance * multiplier[None, :]  # search cost per leg
+        leg_fuel = weighted.astype(int)  # fuel actually charged per leg
+        value = [self.cargo_values.get(code) for code in nodes]
+        cargo_nodes = [j for j in range(n) if value[j] is not None]
+
+        # Lower bound: straight to the destination once the cargo is in,
+        # otherwise through at least one more unvisited cargo airport
+        def bound(i, visited, count):
+            if count == self.goal:
+                return FUEL_PER_KM * distance[i, dest]
+            rest = [distance[i, j] + distance[j, dest] for j in cargo_nodes if not visited >> j & 1]
+            return FUEL_PER_KM * min(rest) if rest else None
+
+        def arrive(j, visited, count, money):
+            if value[j] is None or visited >> j & 1 or count == self.goal:
+                return visited, count, money, 0
+            pickups = min(self.goal - count, self.max_pickups)
+            return visited | 1 << j, count + pickups, money + pickups * value[j], pickups
+
+        def fly(i, j, fuel, money):
+            need = int(leg_fuel[i, j])
+            buy = max(0, need - fuel)
+            if buy * FUEL_PRICE > money:
+                return None
+            return fuel + buy - need, money - buy * FUEL_PRICE, buy
+
+        visited, count, money, pickups = arrive(0, 0, cargo, money)
+        start = (0, visited, count, fuel, money)
+        best_cost, best_steps = self._greedy(start, pickups, weighted, fly, arrive, dest, cargo_nodes)
+        complete = True
+
+        h = bound(0, visited, count)
+        if h is None and count < self.goal:
+            return self._result(nodes, best_steps, True, leg_fuel)
+        counter = 0
+        queue = [(h or 0.0, 0.0, counter, start, [(0, pickups, 0)])]
+        seen = {}
+        while queue:
+            f, g, _, (i, visited, count, fuel, money), steps = heapq.heappop(queue)
+            if best_cost is not None and f >= best_cost:
+                break
+            if i == dest and count == self.goal:
+                best_cost, best_steps = g, steps
+                break
+            if time.perf_counter() - started > self.time_budget:
+                complete = False
+                break
+            key = (i, visited, count)
+            previous = seen.get(key)
+            if previous and previous[0] <= g and previous[1] >= fuel and previous[2] >= money:
+                continue
+            seen[key] = (g, fuel, money)
+
+            for j in range(n):
+                if j == i:
+                    continue
+                if count < self.goal and (value[j] is None or visited >> j & 1):
+                    continue
+                if count == self.goal and j != dest:
+                    continue
+                leg = fly(i, j, fuel, money)
+                if leg is None:
+                    continue
+                next_fuel, next_money, buy = leg
+                next_visited, next_count, next_money, picked = arrive(j, visited, count, next_money)
+                h = bound(j, next_visited, next_count)
+                if h is None:
+                    continue
+                next_g = g + weighted[i, j]
+                counter += 1
+                heapq.heappush(queue, (next_g + h, next_g, counter,
+                                       (j, next_visited, next_count, next_fuel, next_money),
+                                       steps + [(j, picked, buy)]))
+        return self._result(nodes, best_steps, complete, leg_fuel)
+
+    # Nearest-feasible-next route used as the initial incumbent
+    def _greedy(self, start, pickups, weighted, fly, arrive, dest, cargo_nodes):
+        i, visited, count, fuel, money = start
+        steps = [(0, pickups, 0)]
+        cost = 0.0
+        while not (i == dest and count == self.goal):
+            if count == self.goal:
+                options = [dest]
+            else:
+                options = sorted((j for j in cargo_nodes if j != i and not visited >> j & 1),
+                                 key=lambda j: weighted[i, j] + weighted[j, dest])
+            for j in options:
+                leg = fly(i, j, fuel, money)
+                if leg is not None:
+                    break
+            else:
+                return None, None
+            fuel, money, buy = leg
+            cost += weighted[i, j]
+            visited, count, money, picked = arrive(j, visited, count, money)
+            steps.append((j, picked, buy))
+            i = j
+        return cost, steps
+
+    def _result(self, nodes, steps, complete, leg_fuel):
+        if steps is None:
+            return None
+        route = []
+        fuel_used = 0
+        fuel_bought = 0
+        for (prev, _, _), (j, picked, buy) in zip([(None, 0, 0)] + steps[:-1], steps):
+            used = int(leg_fuel[prev, j]) if prev is not None else 0
+            fuel_used += used
+            fuel_bought += buy
+            route.append({"airport": nodes[j], "buy_fuel": buy, "fuel_used": used, "collect": picked})
+        return {"route": route, "fuel_used": fuel_used, "fuel_bought": fuel_bought,
+                "cost": fuel_bought * FUEL_PRICE, "optimal": complete}
+
+
+# Process-wide planner, rebuilt when the airport catalog or cargo values are reloaded
+_planner = None
+_planner_lock = threading.Lock()
+
+
+def get_planner(storage, destination, goal):
+    global _planner
+    catalog = get_catalog(storage)
+    cargo_values = get_cargo_values(storage)
+    with _planner_lock:
+        planner = _planner
+        if planner is None or planner.catalog is not catalog or planner.cargo_values is not cargo_values:
+            planner = _planner = RoutePlanner(catalog, cargo_values, destination, goal)
+        return planner
@@ -1,6 +1,17 @@
-import random
 import mysql.connector
+from mysql.connector.constants import ClientFlag
 from math import radians, sin, cos, sqrt, atan2
+from airports import get_catalog
+from cargo import get_cargo_values
+from storage import SQLStorage
+from planner import get_planner
+from fuel_costs import fuel_costs
+from leaderboard import leaderboard
+from weather import weather
+
+AIRPORT_LIST_LIMIT = 20  # nearest airports shown before each flight
+WINNING_CARGO = 8
+DESTINATION = 'LIPE'
 
 def connect_to_db():
     try:
@@ -10,7 +21,8 @@ def connect_to_db():
             user='root',
             password='12345',
             database='flight_path',
-            autocommit=True
+            autocommit=True,
+            client_flags=[ClientFlag.FOUND_ROWS]  # rowcount = matched rows, see storage.py
         )
         if conn.is_connected():
             print("Connection Established")
@@ -19,37 +31,103 @@ def connect_to_db():
         print(f"Error: {err}")
         return None
 
-#Start Game
-def start_game():
-    conn = connect_to_db()
-    if not conn:
-        print("Database connection failed.")
-        return
+def _quiet(*args, **kwargs):
+    pass
+
+# Game Session
+# Holds one storage backend for the whole game; for MySQL that is one connection,
+# so actions skip the connect/auth handshake
+class GameSession:
+    def __init__(self, db=None, verbose=True, conn=None, storage=None, events=None):
+        self.db = db
+        self.player_id = None
+        self.state = None  # last known player row, updated in place by the actions
+        self.won = False
+        self.win_hooks = []  # called as hook(session, state) once the player wins
+        self.say = print if verbose else _quiet  # messages for the CLI player
+        self.events = events  # optional events.EventLog the actions append to
+        self.owns_conn = False
+        if storage is None:
+            if conn is None:
+                self.owns_conn = True
+                if db is not None:
+                    conn = db.checkout()  # pooled connection from db_connection.Database
+                else:
+                    conn = connect_to_db()
+            # conn may also be caller-managed, e.g. the local stand-in in local_db
+            storage = SQLStorage(conn) if conn else None
+        self.conn = conn
+        self.storage = storage
+
+    def cached_state(self, player_id):
+        if self.state is not None and self.state["player_id"] == player_id:
+            return self.state
+        return None
 
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""UPDATE new_airports SET high_consumption=0;""")
-        conn.commit()
+    # Player row for the actions; read once per session and then kept in step by them
+    def player_state(self, player_id):
+        if self.cached_state(player_id) is None:
+            self.state = self.storage.get_player(player_id)
+        return self.state
+
+    def forget_state(self):
+        self.state = None
+
+    def record(self, event, player_id, **fields):
+        if self.events is not None:
+            self.events.append(event, player_id, **fields)
+
+    def on_win(self, hook):
+        self.win_hooks.append(hook)
+        return hook
+
+    # Actions call this after committing a change; the win is derived from the
+    # snapshot they already updated, so no query is needed to detect it
+    def state_changed(self):
+        if not self.won and self.state and has_won(self.state):
+            self.won = True
+            player_id = self.state["player_id"]
+            won_seconds = leaderboard.player_won(self.state)
+            if won_seconds is not None:
+                self.storage.record_win(player_id, won_seconds)
+            end_game(self, player_id)
+            for hook in self.win_hooks:
+                hook(self, self.state)
+
+    def close(self):
+        if self.conn and self.owns_conn:
+            if self.db is not None:
+                self.db.release(self.conn)
+            else:
+                self.conn.close()
+        self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+#Start Game
+def start_game(session, player_name=None):
+    if player_name is None:
         player_name = input("Enter your name: ")
-        print(f"Welcome, {player_name}!")
-        cursor.execute(
-            """
-            INSERT INTO player (
-                screen_name, fuel_amount, total_money, cargo_collected, 
-                start_location, destination, end_location
-            ) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """,
-            (player_name, 3000, 0, 0, 'LEMD', 'LIPE', 'LEMD')
-        )
-        conn.commit()
-        cursor.execute("SELECT LAST_INSERT_ID()")
-        player_id = int(cursor.fetchone()[0])
-        print(f"Player created with ID: {player_id}")
-        return player_id
-    finally:
-        cursor.close()
-        conn.close()
+    session.say(f"Welcome, {player_name}!")
+    player_id = session.storage.create_player(player_name, 3000, 0, 0, 'LEMD', 'LIPE', 'LEMD')
+    session.player_id = player_id
+    session.state = {"player_id": player_id, "screen_name": player_name, "fuel_amount": 3000,
+                     "total_money": 0, "cargo_collected": 0, "end_location": 'LEMD'}
+    session.record("start", player_id, name=player_name, fuel=3000, money=0, location='LEMD')
+    leaderboard.player_started(player_id, player_name)
+    session.say(f"Player created with ID: {player_id}")
+    return player_id
+
+# Game over (won or quit): drops the player's in-memory weather and fuel table
+def end_game(session, player_id):
+    session.storage.end_game(player_id)
+    weather.clear(player_id)
+    fuel_costs.clear(player_id)
+    leaderboard.game_ended(player_id)
 
 # Calculate Distance
 def calculate_distance(lat1, lon1, lat2, lon2):
@@ -61,303 +139,235 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     return R * c
 
 # Winning Condition Check
-def check_winning_condition(player_id):
-    conn = connect_to_db()
-    if not conn:
-        return False
+def has_won(state):
+    return state["cargo_collected"] == WINNING_CARGO and state["end_location"] == DESTINATION
 
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "SELECT cargo_collected, end_location FROM player WHERE player_id = %s",
-            (player_id,)
-        )
-        result = cursor.fetchone()
-        print(result)
-        if result[0] == 8 and result[1] == 'LIPE':
-            print("Congratulations! You have won the game!")
-            return True
+def check_winning_condition(session, player_id):
+    state = session.player_state(player_id)
+    if not state:
         return False
-    finally:
-        cursor.close()
-        conn.close()
-
-def get_airports_with_distances(player_id):
-    conn = connect_to_db()
-    if not conn:
-        print("Database connection failed.")
-        return
+    session.state_changed()
+    return session.won
 
-    cursor = conn.cursor(dictionary=True)
+def get_airports_with_distances(session, player_id, limit=None):
     try:
-        # Get the end_location and its coordinates for the player
-        cursor.execute("""
-            SELECT end_location, latitude_deg, longitude_deg
-            FROM player
-            JOIN new_airports ON player.end_location = new_airports.airport_code
-            WHERE player.player_id = %s
-        """, (player_id,))
-        player_location = cursor.fetchone()
-
-        if not player_location:
-            print(f"No location data found for player_id {player_id}.")
-            return
-
-        end_location = player_location["end_location"]
-        end_lat = float(player_location["latitude_deg"])
-        end_lon = float(player_location["longitude_deg"])
-
-        # Get all airports with their codes and coordinates
-        cursor.execute("""
-            SELECT airport_code, airport_name, latitude_deg, longitude_deg
-            FROM new_airports
-        """)
-        airports = cursor.fetchall()
-
-        # Calculate distances and display the results
-        print(f"Distances from {end_location} to other airports:")
-        airport_distances = []
-        for airport in airports:
-            airport_code = airport["airport_code"]
-            airport_name = airport["airport_name"]
-            lat = float(airport["latitude_deg"])
-            lon = float(airport["longitude_deg"])
-            distance = calculate_distance(end_lat, end_lon, lat, lon)
-            airport_distances.append((airport_code, airport_name, distance))
-
-        # Sort by distance
-        airport_distances.sort(key=lambda x: x[2])
-
-        # Print sorted distances
-        for code, name, dist in airport_distances:
-            print(f"{code}: {dist:.2f} km")
+        # The player's location comes from the session snapshot, coordinates from the airport catalog
+        state = session.player_state(player_id)
+        catalog = get_catalog(session.storage)
 
-    except Exception as e:
-        print(f"An error occurred: {e}")
-    finally:
-        cursor.close()
-        conn.close()
+        if not state or state["end_location"] not in catalog:
+            session.say(f"No location data found for player_id {player_id}.")
+            return
 
-def set_unfavorable_weather():
+        end_location = state["end_location"]
 
-    conn = connect_to_db()
-    if conn is None:
-        print("Failed to connect to database.")
-        return
+        # Nearest-first from the spatial index, no table scan or full sort
+        airport_distances = catalog.nearest(end_location, k=limit)
 
-    cursor = conn.cursor()
+        session.say(f"Distances from {end_location} to other airports:")
+        for code, name, dist in airport_distances:
+            session.say(f"{code}: {dist:.2f} km")
+        return airport_distances
 
-    cursor.execute("SELECT airport_code FROM new_airports")
-    airport_codes = [row[0] for row in cursor.fetchall()]
+    except Exception as e:
+        session.say(f"An error occurred: {e}")
 
-    print("Number of Airports:", len(airport_codes))
+def set_unfavorable_weather(session):
+    catalog = get_catalog(session.storage)
+    session.say("Number of Airports:", len(catalog))
 
-    # Randomly select 3 airport IDs
-    unfavorable_airports = random.sample(airport_codes, 3)
+    # Randomly select 3 airports; the choice lives in this player's weather map, not in new_airports
+    unfavorable_airports = weather.roll(session.player_id, catalog.codes)
+    session.record("weather", session.player_id, airports=sorted(unfavorable_airports))
 
-    # Update the selected airports with high consumption
-    cursor.executemany(
-        "UPDATE new_airports SET high_consumption = 1 WHERE airport_code = %s",
-        [(airport_code,) for airport_code in unfavorable_airports]
-    )
-    conn.commit()
+    # Fuel costs from the player's airport to every airport, weather included
+    state = session.player_state(session.player_id)
+    if state and state["end_location"] in catalog:
+        fuel_costs.build(session.player_id, catalog, state["end_location"])
 
     # Display the airports with unfavorable weather
-    cursor.execute(
-        "SELECT airport_code, airport_name FROM new_airports WHERE high_consumption = 1"
-    )
-    print("Airports with unfavorable weather:")
-    for airport in cursor.fetchall():
-        print(f" - {airport[0]} ({airport[1]}) - Fuel consumption increased by 60%")
-
-    cursor.close()
-    conn.close()
-
-def get_fuel_consumption(player_id, airport_code):
-
-    conn = connect_to_db()
-    if conn is None:
-        print("Failed to connect to database.")
-        return None
+    session.say("Airports with unfavorable weather:")
+    for airport_code in unfavorable_airports:
+        airport_name = catalog.names[catalog.index[airport_code]]
+        session.say(f" - {airport_code} ({airport_name}) - Fuel consumption increased by 60%")
+    return unfavorable_airports
 
-    cursor = conn.cursor()
-
-    # Check if the airport has high consumption due to unfavorable weather
-    cursor.execute(
-        "SELECT high_consumption FROM new_airports WHERE airport_code = %s",
-        (airport_code,)
-    )
-    result = cursor.fetchone()
-    if result and result[0] == 1:
-        print("Unfavorable weather detected. Fuel consumption increased by 60%.")
-        return 1.6  # 60% increase in fuel consumption
-    else:
-        return 1.0  # Normal fuel consumption
+def get_fuel_consumption(session, player_id, airport_code):
+    # Check if the airport has high consumption due to this player's unfavorable weather
+    multiplier = weather.multiplier(player_id, airport_code)
+    if multiplier != 1.0:
+        session.say("Unfavorable weather detected. Fuel consumption increased by 60%.")
+    return multiplier
 
 
 # Fly to Airport
-def fly_to_airport(player_id, target_airport):
-    conn = connect_to_db()
-    if not conn:
-        print("Database connection failed.")
+def fly_to_airport(session, player_id, target_airport):
+    state = session.player_state(player_id)
+    if not state:
+        session.say(f"No player found with ID {player_id}.")
         return
 
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT latitude_deg, longitude_deg FROM new_airports WHERE airport_code = %s", (target_airport,))
-        target_coords = cursor.fetchone()
-
-        cursor.execute(
-            """
-            SELECT latitude_deg, longitude_deg FROM new_airports 
-            WHERE airport_code = (SELECT end_location FROM player WHERE player_id = %s)
-            """,
-            (player_id,)
-        )
-        current_coords = cursor.fetchone()
-
-        if target_coords and current_coords:
-            distance = calculate_distance(current_coords[0], current_coords[1], target_coords[0], target_coords[1])
-            multiplier = get_fuel_consumption(player_id, target_airport)
-            fuel_needed = int(0.5 * distance)  # 2 fuel units per km
-
-            cursor.execute("SELECT fuel_amount, total_money FROM player WHERE player_id = %s", (player_id,))
-            player_stats = cursor.fetchone()
-
-            if player_stats[0] < fuel_needed:
-                print("Not enough fuel. Buy fuel or choose another airport.")
-            else:
-                cursor.execute(
-                    """
-                    UPDATE player 
-                    SET fuel_amount = fuel_amount - %s, end_location = %s 
-                    WHERE player_id = %s
-                    """,
-                    (fuel_needed, target_airport, player_id)
-                )
-                conn.commit()
-                fuel_left = player_stats[0] - fuel_needed
-                distance_can_travel = fuel_left*2
-                print(f"Traveled to {target_airport}. Fuel left: {fuel_left}. Reachable Distance: {distance_can_travel:.2f} km")
-
-        else:
-            print("Invalid airport code.")
-    finally:
-        cursor.close()
-        conn.close()
+    catalog = get_catalog(session.storage)
+    if state["end_location"] not in catalog or target_airport not in catalog:
+        session.say("Invalid airport code.")
+        return {"error": "Invalid airport code"}
+
+    # Distance and weather-adjusted fuel come from the player's fuel-cost table
+    origin, distance, fuel_needed = fuel_costs.table(player_id, catalog, state["end_location"]).leg(target_airport)
+    if origin != state["end_location"]:
+        session.forget_state()
+        session.say("Player state changed. Please try again.")
+        return {"error": "Player state changed"}
+    get_fuel_consumption(session, player_id, target_airport)
+
+    if state["fuel_amount"] < fuel_needed:
+        session.say("Not enough fuel. Buy fuel or choose another airport.")
+        return {"error": "Not enough fuel"}
+
+    # One guarded write: only moves if the player is still where we computed
+    # the distance from and still has the fuel, so concurrent moves cannot overspend
+    if not session.storage.move_player(player_id, state["end_location"], target_airport, fuel_needed):
+        # Row changed under us; drop the cached snapshot so the next action re-reads it
+        session.forget_state()
+        session.say("Player state changed. Please try again.")
+        return {"error": "Player state changed"}
+
+    session.record("fly", player_id, to=target_airport, fuel=fuel_needed)
+    state["fuel_amount"] -= fuel_needed
+    state["end_location"] = target_airport
+    fuel_left = state["fuel_amount"]
+    distance_can_travel = fuel_left*2
+    session.say(f"Traveled to {target_airport}. Fuel left: {fuel_left}. Reachable Distance: {distance_can_travel:.2f} km")
+    session.state_changed()
+    return {"location": target_airport, "fuel_amount": fuel_left, "fuel_used": fuel_needed,
+            "distance_km": round(distance, 2), "won": session.won}
 
 # Buy Fuel
-def buy_fuel(player_id, fuel_amount):
-    conn = connect_to_db()
-    if not conn:
-        print("Database connection failed.")
+def buy_fuel(session, player_id, fuel_amount):
+    cost = fuel_amount * 5  # 5 money units per 1 fuel unit
+    # The money check is part of the write, so two purchases cannot both spend the same money
+    if session.storage.buy_fuel(player_id, fuel_amount, cost):
+        session.record("buy", player_id, fuel=fuel_amount, cost=cost)
+        leaderboard.spent(player_id, cost)
+        state = session.cached_state(player_id)
+        if state:
+            state["total_money"] -= cost
+            state["fuel_amount"] += fuel_amount
+        session.say(f"Bought {fuel_amount} fuel units for {cost} money.")
+        return {"fuel_bought": fuel_amount, "cost": cost}
+
+    # Nothing updated: either no such player or not enough money
+    session.forget_state()
+    if not session.player_state(player_id):
+        session.say(f"No player found with ID {player_id}.")
         return
-
-    cursor = conn.cursor()
-    try:
-        cost = fuel_amount * 5  # 5 money units per 1 fuel unit
-        cursor.execute("SELECT total_money FROM player WHERE player_id = %s", (player_id,))
-        money = cursor.fetchone()[0]
-
-        if money >= cost:
-            cursor.execute(
-                """
-                UPDATE player 
-                SET total_money = total_money - %s, fuel_amount = fuel_amount + %s 
-                WHERE player_id = %s
-                """,
-                (cost, fuel_amount, player_id)
-            )
-            conn.commit()
-            print(f"Bought {fuel_amount} fuel units for {cost} money.")
-        else:
-            print("Not enough money to buy fuel.")
-    finally:
-        cursor.close()
-        conn.close()
+    session.say("Not enough money to buy fuel.")
+    return {"error": "Not enough money"}
 
 # Collect Cargo
-def collect_cargo(player_id):
-    conn = connect_to_db()
-    if not conn:
-        print("Database connection failed.")
+def collect_cargo(session, player_id):
+    state = session.player_state(player_id)
+    if not state:
+        session.say(f"No end_location found for player_id {player_id}")
         return
 
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT end_location FROM player WHERE player_id = %s", (player_id,))
-        result = cursor.fetchone()
-        if not result:
-            print(f"No end_location found for player_id {player_id}")
-            return
-
-        current_location = result[0]
-        query = """
-                SELECT goal.value 
-                FROM goal 
-                JOIN new_airports ON goal.goal_id = new_airports.goal_type 
-                WHERE new_airports.airport_code = %s
-                """
-        cursor.execute(query, (current_location,))
-        result = cursor.fetchone()
-        if not result:
-            print("No cargo available at this airport.")
-            return
+    current_location = state["end_location"]
+    cargo_value = get_cargo_values(session.storage).get(current_location)
+    if cargo_value is None:
+        session.say("No cargo available at this airport.")
+        return {"error": "No cargo available"}
 
-        cargo_value = result[0]
-        cursor.execute(
-            """
-            UPDATE player 
-            SET total_money = total_money + %s, cargo_collected = cargo_collected + 1 
-            WHERE player_id = %s
-            """,
-            (cargo_value, player_id)
-        )
-        conn.commit()
-        print(f"Collected cargo worth {cargo_value} money.")
+    try:
+        collected = session.storage.collect_cargo(player_id, current_location, cargo_value)
     except Exception as e:
-        print(f"An error occurred: {e}")
-    finally:
-        cursor.close()
-        conn.close()
+        session.say(f"An error occurred: {e}")
+        return
 
-# Check Status
-def check_status(player_id):
-    conn = connect_to_db()
-    if not conn:
-        print("Database connection failed.")
+    if not collected:
+        session.forget_state()
+        session.say("Player state changed. Please try again.")
+        return {"error": "Player state changed"}
+
+    session.record("collect", player_id, location=current_location, value=cargo_value)
+    state["total_money"] += cargo_value
+    state["cargo_collected"] += 1
+    leaderboard.collected(state)
+    session.say(f"Collected cargo worth {cargo_value} money.")
+    session.state_changed()
+    return {"cargo_value": cargo_value, "cargo_collected": state["cargo_collected"], "won": session.won}
+
+# Reachable Airports
+def get_reachable_airports(session, player_id):
+    state = session.player_state(player_id)
+    if not state:
+        session.say(f"No player found with ID {player_id}.")
+        return
+    catalog = get_catalog(session.storage)
+    if state["end_location"] not in catalog:
+        return []
+    reachable = fuel_costs.table(player_id, catalog, state["end_location"]).reachable(state["fuel_amount"])
+    session.say(f"Airports reachable with {state['fuel_amount']} fuel:")
+    for code, name, dist, fuel_needed in reachable:
+        session.say(f"{code}: {dist:.2f} km, {fuel_needed} fuel")
+    return reachable
+
+# Suggest Route
+def suggest_route(session, player_id):
+    state = session.player_state(player_id)
+    if not state:
+        session.say(f"No player found with ID {player_id}.")
         return
+    planner = get_planner(session.storage, DESTINATION, WINNING_CARGO)
+    plan = planner.suggest(state["end_location"], state["fuel_amount"], state["total_money"],
+                           state["cargo_collected"], weather.airports(player_id))
+    if not plan:
+        session.say("No feasible route with your current fuel and money.")
+        return {"error": "No feasible route"}
+    session.say("Suggested route:")
+    for stop in plan["route"]:
+        session.say(f" - {stop['airport']}: buy {stop['buy_fuel']} fuel, burn {stop['fuel_used']}, "
+                    f"collect {stop['collect']} cargo")
+    return plan
 
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT * FROM player WHERE player_id = %s", (player_id,))
-        status = cursor.fetchone()
-        if status:
-            print("Player Status:")
-            print(f"Name: {status[1]}")
-            print(f"Fuel: {status[7]}")
-            print(f"Money: {status[5]}")
-            print(f"Cargo Collected: {status[6]}")
-            print(f"Current Location: {status[3]}")
-        else:
-            print(f"No player found with ID {player_id}.")
-    finally:
-        cursor.close()
-        conn.close()
+# Check Status
+def check_status(session, player_id):
+    status = session.storage.get_player(player_id)
+    if status:
+        session.state = status
+        session.say("Player Status:")
+        session.say(f"Name: {status['screen_name']}")
+        session.say(f"Fuel: {status['fuel_amount']}")
+        session.say(f"Money: {status['total_money']}")
+        session.say(f"Cargo Collected: {status['cargo_collected']}")
+        session.say(f"Current Location: {status['end_location']}")
+        return status
+    else:
+        session.say(f"No player found with ID {player_id}.")
 
 
 
 # Main program
 def main():
-    player_id = start_game()
+    session = GameSession()
+    if not session.storage:
+        print("Database connection failed.")
+        return
+
+    with session:
+        play(session)
+
+def play(session):
+    player_id = start_game(session)
     if not player_id:
         return
 
-    set_unfavorable_weather()
+    set_unfavorable_weather(session)
 
-    while True:
-        if check_winning_condition(player_id):
-            break
+    @session.on_win
+    def congratulate(session, state):
+        session.say("Congratulations! You have won the game!")
+
+    while not session.won:
         print("\nOptions:")
         print("1 - Fly to next airport")
         print("2 - Buy fuel")
@@ -367,18 +377,19 @@ def main():
         choice = int(input("Enter your choice: "))
 
         if choice == 1:
-            get_airports_with_distances(player_id)
+            get_airports_with_distances(session, player_id, limit=AIRPORT_LIST_LIMIT)
             target_airport = input("Enter the airport code: ")
-            fly_to_airport(player_id, target_airport)
+            fly_to_airport(session, player_id, target_airport)
 
         elif choice == 2:
             fuel_amount = int(input("Enter the amount of fuel to buy: "))
-            buy_fuel(player_id, fuel_amount)
+            buy_fuel(session, player_id, fuel_amount)
         elif choice == 3:
-            collect_cargo(player_id)
+            collect_cargo(session, player_id)
         elif choice == 4:
-            check_status(player_id)
+            check_status(session, player_id)
         elif choice == 5:
+            end_game(session, player_id)
             print("Exiting game. Thank you for playing!")
             break
         else:
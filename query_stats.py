@@ -0,0 +1,237 @@
+# Per-statement instrumentation for db_connection.Database: wall time, rows,
+# the game function that issued the statement, and totals per normalized SQL
+# shape (literals and whitespace folded, so every player's
+# "SELECT ... WHERE player_id = %s" counts as one shape). Statements slower than
+# slow_query_ms go to the slow-query log. render_prometheus() exposes the totals
+# in the Prometheus text format.
+import json
+import re
+import sys
+import threading
+import time
+
+# Histogram buckets in seconds for all statements together
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Frames in these files are the database layer itself, not the caller we want to report
+_INTERNAL_FILES = ("query_stats.py", "db_connection.py", "storage.py", "contextlib.py", "write_behind.py")
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize(sql):
+    sql = _STRING.sub("?", sql)
+    sql = sql.replace("%s", "?")
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("(?+)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+# "module.function" of the nearest caller outside the database layer
+def call_site():
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not filename.endswith(_INTERNAL_FILES):
+            module = filename.rsplit("/", 1)[-1].rsplit("\\", 1)[-1][:-3]
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+class ShapeStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+
+
+class QueryStats:
+    def __init__(self, slow_query_ms=None, slow_query_log=None):
+        self.slow_query_ms = slow_query_ms
+        self.slow_query_log = slow_query_log  # file path; slow queries are printed when unset
+        self.listeners = []  # called as listener(shape, seconds, rows, site) after every statement
+        self._shapes = {}  # normalized SQL -> ShapeStats
+        self._sites = {}  # call site -> statement count
+        self._buckets = [0] * len(BUCKETS)
+        self._count = 0
+        self._seconds = 0.0
+        self._slow = 0
+        self._shape_cache = {}  # raw SQL -> normalized, the game only has a few distinct texts
+        self._lock = threading.Lock()
+
+    def shape(self, sql):
+        shape = self._shape_cache.get(sql)
+        if shape is None:
+            shape = normalize(sql)
+            if len(self._shape_cache) < 10_000:
+                self._shape_cache[sql] = shape
+        return shape
+
+    def record(self, sql, seconds, rows, site, error=False):
+        shape = self.shape(sql)
+        with self._lock:
+            stats = self._shapes.get(shape)
+            if stats is None:
+                stats = self._shapes[shape] = ShapeStats()
+            stats.count += 1
+            stats.errors += error
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.rows += rows
+            self._sites[site] = self._sites.get(site, 0) + 1
+            self._count += 1
+            self._seconds += seconds
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    self._buckets[i] += 1
+                    break
+            slow = self.slow_query_ms is not None and seconds * 1000 >= self.slow_query_ms
+            if slow:
+                self._slow += 1
+        if slow:
+            self._log_slow(shape, seconds, rows, site)
+        for listener in self.listeners:
+            listener(shape, seconds, rows, site)
+
+    def _log_slow(self, shape, seconds, rows, site):
+        if self.slow_query_log is None:
+            print(f"Slow query ({seconds * 1000:.1f} ms, {rows} rows) from {site}: {shape}")
+            return
+        entry = {"ts": round(time.time(), 3), "ms": round(seconds * 1000, 3), "rows": rows,
+                 "site": site, "sql": shape}
+        with open(self.slow_query_log, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    # Shapes ordered by total time, for /stats/db
+    def top(self, limit=20):
+        with self._lock:
+            shapes = sorted(self._shapes.items(), key=lambda item: item[1].seconds, reverse=True)[:limit]
+            return [{"sql": shape, "count": s.count, "errors": s.errors, "rows": s.rows,
+                     "total_ms": round(s.seconds * 1000, 3), "avg_ms": round(s.seconds / s.count * 1000, 3),
+                     "max_ms": round(s.max_seconds * 1000, 3)} for shape, s in shapes]
+
+    def render_prometheus(self, prefix="skycargo_db"):
+        def label(value):
+            return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            lines.extend(f"{prefix}_{name}{labels} {value}" for labels, value in samples)
+
+        with self._lock:
+            shapes = [(f'{{shape="{label(shape)}"}}', s) for shape, s in self._shapes.items()]
+            metric("queries_total", "counter", "Statements executed, per normalized SQL shape.",
+                   [(labels, s.count) for labels, s in shapes])
+            metric("query_errors_total", "counter", "Statements that raised, per shape.",
+                   [(labels, s.errors) for labels, s in shapes])
+            metric("query_seconds_total", "counter", "Wall time spent in statements, per shape.",
+                   [(labels, f"{s.seconds:.6f}") for labels, s in shapes])
+            metric("query_rows_total", "counter", "Rows returned or affected, per shape.",
+                   [(labels, s.rows) for labels, s in shapes])
+            metric("queries_by_site_total", "counter", "Statements per calling game function.",
+                   [(f'{{site="{label(site)}"}}', count) for site, count in self._sites.items()])
+            metric("slow_queries_total", "counter", "Statements over the slow-query threshold.",
+                   [("", self._slow)])
+
+            cumulative = 0
+            buckets = []
+            for bound, count in zip(BUCKETS, self._buckets):
+                cumulative += count
+                buckets.append((f'_bucket{{le="{bound}"}}', cumulative))
+            buckets += [('_bucket{le="+Inf"}', self._count), ("_sum", f"{self._seconds:.6f}"),
+                        ("_count", self._count)]
+            metric("query_duration_seconds", "histogram", "Statement wall time.", buckets)
+        return "\n".join(lines) + "\n"
+
+
+# Cursor wrapper: times execute plus the fetches that follow it, and records the
+# statement when the next one starts or the cursor closes
+class InstrumentedCursor:
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+        self._pending = None  # [sql, seconds, rows fetched, site]
+
+    def _finish(self):
+        pending = self._pending
+        if pending is not None:
+            self._pending = None
+            sql, seconds, fetched, site = pending
+            rows = fetched if fetched is not None else max(self._cursor.rowcount or 0, 0)
+            self._stats.record(sql, seconds, rows, site)
+
+    def _run(self, method, sql, params):
+        self._finish()
+        site = call_site()
+        started = time.perf_counter()
+        try:
+            result = method(sql, params) if params is not None else method(sql)
+        except Exception:
+            self._stats.record(sql, time.perf_counter() - started, 0, site, error=True)
+            raise
+        self._pending = [sql, time.perf_counter() - started, None, site]
+        return result
+
+    def execute(self, sql, params=None):
+        return self._run(self._cursor.execute, sql, params)
+
+    def executemany(self, sql, params):
+        return self._run(self._cursor.executemany, sql, params)
+
+    def _fetched(self, started, count):
+        pending = self._pending
+        if pending is not None:
+            pending[1] += time.perf_counter() - started
+            pending[2] = (pending[2] or 0) + count
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(started, row is not None)
+        return row
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchmany(self, size=1):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(size)
+        self._fetched(started, len(rows))
+        return rows
+
+    # Records the last statement now; for cursors that stay open between statements
+    def done(self):
+        self._finish()
+
+    def close(self):
+        self._finish()
+        return self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+# Connection wrapper handing out instrumented cursors; everything else passes through
+class InstrumentedConnection:
+    def __init__(self, conn, stats):
+        self._conn = conn
+        self._stats = stats
+        self.prepared = {}  # (statement name, dictionary) -> open prepared cursor, see Database.run
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._stats)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
@@ -0,0 +1,267 @@
+# Versioned schema for the flight_path MySQL database and a check that the hot
+# queries use indexes.
+#
+#   python schema.py status     # applied and pending migrations
+#   python schema.py migrate    # apply pending migrations
+#   python schema.py check      # EXPLAIN the hot queries, exit 1 on a full table scan
+#
+# Migrations are idempotent against databases that were created by hand: tables
+# are created only if missing, keys and indexes only if the column has none.
+import sys
+
+import mysql.connector
+
+from storage import (BUY_FUEL_SQL, COLLECT_SQL, GET_PLAYER_SQL, LEADERBOARD_SQL, MOVE_SQL, RECORD_WIN_SQL,
+                     collect_many_sql)
+
+
+class SchemaError(Exception):
+    pass
+
+
+def _has_index(cursor, table, column):
+    cursor.execute(
+        """
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s AND seq_in_index = 1
+        """,
+        (table, column)
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def _has_primary_key(cursor, table):
+    cursor.execute(
+        """
+        SELECT COUNT(*) FROM information_schema.table_constraints
+        WHERE table_schema = DATABASE() AND table_name = %s AND constraint_type = 'PRIMARY KEY'
+        """,
+        (table,)
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def _has_column(cursor, table, column):
+    cursor.execute(
+        """
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        """,
+        (table, column)
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def create_tables(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS goal (
+            goal_id INT NOT NULL,
+            name VARCHAR(64),
+            value INT NOT NULL,
+            PRIMARY KEY (goal_id)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS new_airports (
+            airport_code VARCHAR(10) NOT NULL,
+            airport_name VARCHAR(255) NOT NULL,
+            latitude_deg DOUBLE NOT NULL,
+            longitude_deg DOUBLE NOT NULL,
+            goal_type INT NULL,
+            high_consumption TINYINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (airport_code)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS player (
+            player_id INT NOT NULL AUTO_INCREMENT,
+            screen_name VARCHAR(64),
+            start_location VARCHAR(10),
+            end_location VARCHAR(10),
+            destination VARCHAR(10),
+            total_money INT NOT NULL DEFAULT 0,
+            cargo_collected INT NOT NULL DEFAULT 0,
+            fuel_amount INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (player_id)
+        )
+    """)
+
+
+# Hand-made databases may have the tables without keys
+def add_keys(cursor):
+    for table, column in (("goal", "goal_id"), ("new_airports", "airport_code"), ("player", "player_id")):
+        if not _has_primary_key(cursor, table) and not _has_index(cursor, table, column):
+            cursor.execute(f"ALTER TABLE {table} ADD PRIMARY KEY ({column})")
+
+
+# high_consumption is not indexed: weather lives in memory (weather.py) and no query reads it
+def add_indexes(cursor):
+    if not _has_index(cursor, "new_airports", "goal_type"):
+        cursor.execute("CREATE INDEX idx_new_airports_goal_type ON new_airports (goal_type)")
+
+
+def add_won_seconds(cursor):
+    if not _has_column(cursor, "player", "won_seconds"):
+        cursor.execute("ALTER TABLE player ADD COLUMN won_seconds INT NULL")
+
+
+# Descending where the board ranks high values first, so each board reads its LIMIT rows off the index
+def add_leaderboard_indexes(cursor):
+    for name, column, definition in (("idx_player_money", "total_money", "total_money DESC, player_id"),
+                                     ("idx_player_cargo", "cargo_collected", "cargo_collected DESC, player_id"),
+                                     ("idx_player_won_seconds", "won_seconds", "won_seconds, player_id")):
+        if not _has_index(cursor, "player", column):
+            cursor.execute(f"CREATE INDEX {name} ON player ({definition})")
+
+
+# (version, description, function(cursor)), applied in order
+MIGRATIONS = [
+    (1, "create goal, new_airports and player", create_tables),
+    (2, "primary keys on goal_id, airport_code and player_id", add_keys),
+    (3, "index on new_airports.goal_type", add_indexes),
+    (4, "player.won_seconds for the fastest-win leaderboard", add_won_seconds),
+    (5, "leaderboard indexes on player money, cargo and won_seconds", add_leaderboard_indexes),
+]
+
+
+def current_version(cursor):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.tables
+        WHERE table_schema = DATABASE() AND table_name = 'schema_version'
+    """)
+    if not cursor.fetchone()[0]:
+        return 0
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return cursor.fetchone()[0]
+
+
+def pending(conn):
+    cursor = conn.cursor()
+    try:
+        version = current_version(cursor)
+    finally:
+        cursor.close()
+    return [migration for migration in MIGRATIONS if migration[0] > version]
+
+
+def migrate(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INT NOT NULL PRIMARY KEY,
+                description VARCHAR(255),
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    finally:
+        cursor.close()
+    applied = []
+    for version, description, apply in pending(conn):
+        cursor = conn.cursor()
+        try:
+            apply(cursor)
+            cursor.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                           (version, description))
+            conn.commit()
+        finally:
+            cursor.close()
+        print(f"Applied migration {version}: {description}")
+        applied.append(version)
+    return applied
+
+
+# (name, sql, sample params, tables the query is meant to read in full)
+HOT_QUERIES = [
+    ("get_player", GET_PLAYER_SQL, (1,), ()),
+    ("move_player", MOVE_SQL, (0, "LIPE", 1, "LEMD", 0), ()),
+    ("buy_fuel", BUY_FUEL_SQL, (0, 0, 1, 0), ()),
+    ("collect_cargo", COLLECT_SQL, (0, 1, "LEMD"), ()),
+    ("collect_many", collect_many_sql(2), (1, 0, 2, 0, 1, 1, 2, 1, 1, 2, 1, "LEMD", 2, "LEMD"), ()),
+    ("record_win", RECORD_WIN_SQL, (0, 1), ()),
+    ("leaderboard_money", LEADERBOARD_SQL["money"], (101,), ()),
+    ("leaderboard_cargo", LEADERBOARD_SQL["cargo"], (101,), ()),
+    ("leaderboard_fastest", LEADERBOARD_SQL["fastest"], (101,), ()),
+    ("airport_catalog", "SELECT airport_code, airport_name, latitude_deg, longitude_deg FROM new_airports",
+     (), ("new_airports",)),
+    ("cargo_values", """
+        SELECT new_airports.airport_code, goal.value
+        FROM new_airports
+        JOIN goal ON goal.goal_id = new_airports.goal_type
+    """, (), ("new_airports", "goal")),
+]
+
+
+# EXPLAINs every hot query and describes each unexpected full table scan. A join
+# may read one side in full (the optimizer drives small tables that way) but
+# must look the other side up through an index. A query that cannot be
+# EXPLAINed (a column the schema lacks) is a problem too
+def full_scans(conn):
+    problems = []
+    cursor = conn.cursor(dictionary=True)
+    try:
+        for name, sql, params, full_read in HOT_QUERIES:
+            try:
+                cursor.execute("EXPLAIN " + sql, params)
+            except mysql.connector.Error as err:
+                problems.append(f"{name}: EXPLAIN failed: {err}")
+                continue
+            plan = [{key.lower(): value for key, value in row.items()} for row in cursor.fetchall()]
+            scans = [row.get("table") for row in plan if row.get("type") == "ALL"]
+            for table in scans:
+                if table not in full_read:
+                    problems.append(f"{name}: full scan of {table}")
+            if len(plan) > 1 and len(scans) == len(plan):
+                problems.append(f"{name}: join without an index on {', '.join(scans)}")
+    finally:
+        cursor.close()
+    return problems
+
+
+# Startup check: prints pending migrations and full scans; strict refuses to start.
+# The hot queries are only EXPLAINed once every migration is applied, since
+# they may name columns a pending migration adds
+def check_schema(conn, strict=False):
+    problems = [f"migration {version} not applied: {description}" for version, description, _ in pending(conn)]
+    if problems:
+        problems.append("hot queries not checked until the migrations are applied")
+    else:
+        problems = full_scans(conn)
+    for problem in problems:
+        print(f"Schema warning: {problem}")
+    if problems and strict:
+        raise SchemaError("; ".join(problems))
+    return problems
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    from python import connect_to_db
+    conn = connect_to_db()
+    if not conn:
+        sys.exit(1)
+    try:
+        if command == "migrate":
+            if not migrate(conn):
+                print("Schema is up to date")
+        elif command == "check":
+            if check_schema(conn):
+                sys.exit(1)
+            print("All hot queries use indexes")
+        elif command == "status":
+            waiting = pending(conn)
+            print(f"Schema version {MIGRATIONS[-1][0] - len(waiting)} of {MIGRATIONS[-1][0]}")
+            for version, description, _ in waiting:
+                print(f"  pending {version}: {description}")
+        else:
+            print("Usage: python schema.py [status|migrate|check]")
+            sys.exit(2)
+    except mysql.connector.Error as err:
+        print(f"Error: {err}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# Headless simulation: runs many scripted or policy-driven players through the
+# python.py game logic without print/input and reports throughput and latency.
+#
+#   python simulate.py --players 1000 --policy random
+#   python simulate.py --replay traffic.jsonl
+#   python simulate.py --backend memory   # game logic only, no SQL at all
+#   python simulate.py --backend mysql    # against the real flight_path database
+#
+# Replay files hold one JSON action per line, e.g.
+#   {"player": "p1", "action": "start"}
+#   {"player": "p1", "action": "fly", "airport": "LIPE"}
+#   {"player": "p1", "action": "fuel", "amount": 100}
+#   {"player": "p1", "action": "cargo"}
+import argparse
+import json
+import random
+import time
+
+from airports import get_catalog, invalidate_catalog
+from cargo import get_cargo_values, invalidate_cargo_values
+from fuel_costs import fuel_costs
+from local_db import connect_local
+from storage import MemoryStorage, SQLStorage
+from python import (GameSession, WINNING_CARGO, DESTINATION, connect_to_db, start_game,
+                    set_unfavorable_weather, fly_to_airport, buy_fuel, collect_cargo, check_status)
+
+FUEL_PRICE = 5
+
+
+# Weather-adjusted, from the same per-player table fly_to_airport charges from
+def fuel_cost(catalog, state, target):
+    return fuel_costs.table(state["player_id"], catalog, state["end_location"]).leg(target)[2]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}  # action -> list of seconds
+        self.turns = 0
+
+    def call(self, action, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        self.latencies.setdefault(action, []).append(time.perf_counter() - started)
+        self.turns += 1
+        return result
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+# Policies return the next (action, argument) for a player, or None to stop
+def random_policy(rng, catalog, cargo_values, state):
+    here = state["end_location"]
+    if here in cargo_values and state["cargo_collected"] < WINNING_CARGO and rng.random() < 0.3:
+        return "cargo", None
+    targets = [code for code, _, _ in catalog.nearest(here, k=10) if code != here]
+    target = rng.choice(targets)
+    needed = fuel_cost(catalog, state, target)
+    if needed > state["fuel_amount"]:
+        shortfall = needed - state["fuel_amount"]
+        if shortfall * FUEL_PRICE > state["total_money"]:
+            return None
+        return "fuel", shortfall
+    return "fly", target
+
+
+def greedy_policy(rng, catalog, cargo_values, state):
+    here = state["end_location"]
+    if state["cargo_collected"] < WINNING_CARGO:
+        if here in cargo_values:
+            return "cargo", None
+        target = next(code for code, _, _ in catalog.nearest(here) if code in cargo_values)
+    else:
+        target = DESTINATION
+    needed = fuel_cost(catalog, state, target)
+    if needed > state["fuel_amount"]:
+        shortfall = needed - state["fuel_amount"]
+        if shortfall * FUEL_PRICE > state["total_money"]:
+            return None
+        return "fuel", shortfall
+    return "fly", target
+
+
+POLICIES = {"random": random_policy, "greedy": greedy_policy}
+
+
+def perform(recorder, session, player_id, action, argument=None):
+    if action == "fly":
+        return recorder.call("fly", fly_to_airport, session, player_id, argument)
+    if action == "fuel":
+        return recorder.call("fuel", buy_fuel, session, player_id, argument)
+    if action == "cargo":
+        return recorder.call("cargo", collect_cargo, session, player_id)
+    if action == "status":
+        return recorder.call("status", check_status, session, player_id)
+    raise ValueError(f"Unknown action {action!r}")
+
+
+def new_player(recorder, storage, name):
+    session = GameSession(storage=storage, verbose=False)
+    player_id = recorder.call("start", start_game, session, name)
+    recorder.call("weather", set_unfavorable_weather, session)
+    return session, player_id
+
+
+def run_policy(storage, recorder, players, max_turns, policy, rng):
+    catalog = get_catalog(storage)
+    cargo_values = get_cargo_values(storage)
+    wins = 0
+    for n in range(players):
+        session, player_id = new_player(recorder, storage, f"sim{n}")
+        for _ in range(max_turns):
+            if session.won:
+                break
+            step = policy(rng, catalog, cargo_values, session.state)
+            if step is None:
+                break
+            perform(recorder, session, player_id, *step)
+        wins += session.won
+        session.close()
+    return wins
+
+
+def run_replay(storage, recorder, path):
+    sessions = {}
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            key = event["player"]
+            if event["action"] == "start":
+                sessions[key] = new_player(recorder, storage, str(key))
+                continue
+            session, player_id = sessions[key]
+            perform(recorder, session, player_id, event["action"], event.get("airport", event.get("amount")))
+    return sum(session.won for session, _ in sessions.values())
+
+
+def report(recorder, wins, players, elapsed):
+    print(f"players: {players}  wins: {wins}  turns: {recorder.turns}  "
+          f"elapsed: {elapsed:.2f}s  turns/s: {recorder.turns / elapsed:,.0f}")
+    print(f"{'action':<8} {'count':>8} {'p50 us':>10} {'p99 us':>10}")
+    for action, values in sorted(recorder.latencies.items()):
+        print(f"{action:<8} {len(values):>8} {percentile(values, 50) * 1e6:>10.1f} "
+              f"{percentile(values, 99) * 1e6:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--max-turns", type=int, default=200)
+    parser.add_argument("--airports", type=int, default=200, help="synthetic airports for the local backends")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="random")
+    parser.add_argument("--replay", help="JSONL file of recorded actions to replay instead of a policy")
+    parser.add_argument("--backend", choices=["sqlite", "memory", "mysql"], default="sqlite")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    conn = None
+    if args.backend == "memory":
+        storage = MemoryStorage.seeded(airports=args.airports, seed=args.seed)
+    else:
+        conn = connect_to_db() if args.backend == "mysql" else connect_local(airports=args.airports, seed=args.seed)
+        if not conn:
+            return
+        storage = SQLStorage(conn)
+    invalidate_catalog()
+    invalidate_cargo_values()
+    random.seed(args.seed)  # weather rolls
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    if args.replay:
+        wins = run_replay(storage, recorder, args.replay)
+        players = len(recorder.latencies.get("start", []))
+    else:
+        wins = run_policy(storage, recorder, args.players, args.max_turns, POLICIES[args.policy],
+                          random.Random(args.seed))
+        players = args.players
+    elapsed = time.perf_counter() - started
+    if conn:
+        conn.close()
+    report(recorder, wins, players, elapsed)
+
+
+if __name__ == "__main__":
+    main()
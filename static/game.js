@@ -0,0 +1,104 @@
+'use strict';
+
+// Airport catalog, kept in localStorage between sessions and refreshed with
+// /api/airports?since=<version>, which only sends what changed
+const CATALOG_KEY = 'skycargo.airports';
+
+function loadCachedCatalog() {
+    try {
+        return JSON.parse(localStorage.getItem(CATALOG_KEY));
+    } catch (e) {
+        return null;
+    }
+}
+
+async function fetchCatalog() {
+    const cached = loadCachedCatalog();
+    const url = cached ? `/api/airports?since=${encodeURIComponent(cached.version)}` : '/api/airports';
+    const response = await fetch(url);
+    if (!response.ok) {
+        return cached ? cached.airports : [];
+    }
+    const feed = await response.json();
+
+    let airports = {};
+    if (!feed.full && cached) {
+        for (const row of cached.airports) {
+            airports[row[0]] = row;
+        }
+        for (const code of feed.removed) {
+            delete airports[code];
+        }
+    }
+    for (const row of feed.airports) {
+        airports[row[0]] = row;
+    }
+    airports = Object.values(airports);
+
+    try {
+        localStorage.setItem(CATALOG_KEY, JSON.stringify({version: feed.version, airports: airports}));
+    } catch (e) {
+        // storage full or disabled; the HTTP cache still revalidates with the ETag
+    }
+    return airports;
+}
+
+function fillAirportSelect(airports) {
+    const select = document.getElementById('airport-select');
+    const fragment = document.createDocumentFragment();
+    const sorted = airports.slice().sort((a, b) => a[1].localeCompare(b[1]));
+    for (const [code, name] of sorted) {
+        const option = document.createElement('option');
+        option.value = code;
+        option.textContent = `${name} (${code})`;
+        fragment.appendChild(option);
+    }
+    select.appendChild(fragment);
+}
+
+const map = L.map('map').setView([50, 10], 4);
+L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
+    maxZoom: 18,
+    attribution: '&copy; OpenStreetMap contributors'
+}).addTo(map);
+
+// Only the markers in view are fetched; at low zoom the server sends grid clusters
+const markers = L.layerGroup().addTo(map);
+let viewportRequest = 0;
+
+function clusterIcon(count) {
+    const size = count < 10 ? 28 : count < 100 ? 34 : 42;
+    return L.divIcon({
+        html: `<div class="airport-cluster">${count}</div>`,
+        className: '',
+        iconSize: [size, size]
+    });
+}
+
+async function loadViewport() {
+    const request = ++viewportRequest;
+    const bounds = map.getBounds();
+    const bbox = [bounds.getWest(), bounds.getSouth(), bounds.getEast(), bounds.getNorth()]
+        .map(value => value.toFixed(4)).join(',');
+    const response = await fetch(`/api/airports/tiles?bbox=${bbox}&zoom=${map.getZoom()}`);
+    if (!response.ok || request !== viewportRequest) {
+        return;
+    }
+    const tiles = await response.json();
+    markers.clearLayers();
+    for (const [lat, lon, count] of tiles.clusters) {
+        L.marker([lat, lon], {icon: clusterIcon(count)})
+            .on('click', () => map.setView([lat, lon], map.getZoom() + 2))
+            .addTo(markers);
+    }
+    for (const [code, name, lat, lon] of tiles.airports) {
+        // Names come from the feed, so they go in as text rather than HTML
+        const label = document.createElement('span');
+        label.textContent = `${name} (${code})`;
+        L.marker([lat, lon]).bindPopup(label).addTo(markers);
+    }
+}
+
+map.on('moveend', loadViewport);
+loadViewport();
+fetchCatalog().then(fillAirportSelect);
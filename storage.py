@@ -0,0 +1,400 @@
+# Storage backends for the player, airport and goal operations the game needs.
+#   SQLStorage     - SQL on one connection (mysql.connector or the local_db stand-in)
+#   MySQLStorage   - the same SQL, each call on a connection from a db_connection.Database pool
+#   MemoryStorage  - plain dicts in this process, for simulations, tests and single-node runs
+import heapq
+import threading
+from contextlib import contextmanager
+
+from local_db import synthetic_data
+
+PLAYER_COLUMNS = "player_id, screen_name, fuel_amount, total_money, cargo_collected, end_location"
+
+
+class Storage:
+    # (airport_code, airport_name, latitude_deg, longitude_deg) for every airport
+    def airport_rows(self):
+        raise NotImplementedError
+
+    # (airport_code, value) for every airport that has cargo
+    def cargo_rows(self):
+        raise NotImplementedError
+
+    # Inserts a player and returns its player_id
+    def create_player(self, screen_name, fuel_amount, total_money, cargo_collected,
+                      start_location, destination, end_location):
+        raise NotImplementedError
+
+    # Player row as a new dict (player_id, screen_name, fuel_amount, total_money,
+    # cargo_collected, end_location), or None
+    def get_player(self, player_id):
+        raise NotImplementedError
+
+    # The write operations apply only if their guard holds and return whether they did
+    def move_player(self, player_id, origin, target, fuel_needed):
+        raise NotImplementedError
+
+    def buy_fuel(self, player_id, fuel_amount, cost):
+        raise NotImplementedError
+
+    def collect_cargo(self, player_id, location, value):
+        raise NotImplementedError
+
+    # Many collections at once; pickups are (value, player_id, location). Returns rows updated
+    def collect_many(self, pickups):
+        raise NotImplementedError
+
+    # Writes full player rows (dicts as returned by get_player) back in one batch
+    def save_players(self, rows):
+        raise NotImplementedError
+
+    # Stores how many seconds the player took to win
+    def record_win(self, player_id, won_seconds):
+        raise NotImplementedError
+
+    # The best `limit` (player_id, screen_name, total_money, cargo_collected, won_seconds)
+    # rows on a leaderboard board ("money", "cargo" or "fastest"), best first, ties by player_id
+    def leaderboard_rows(self, board, limit):
+        raise NotImplementedError
+
+    # Called once a player's game is over (won or quit)
+    def end_game(self, player_id):
+        pass
+
+    def close(self):
+        pass
+
+
+# The per-turn statements; MySQLStorage runs them as prepared statements by name
+CREATE_PLAYER_SQL = """
+    INSERT INTO player (
+        screen_name, fuel_amount, total_money, cargo_collected, 
+        start_location, destination, end_location
+    ) 
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+GET_PLAYER_SQL = f"SELECT {PLAYER_COLUMNS} FROM player WHERE player_id = %s"
+
+MOVE_SQL = """
+    UPDATE player 
+    SET fuel_amount = fuel_amount - %s, end_location = %s 
+    WHERE player_id = %s AND end_location = %s AND fuel_amount >= %s
+"""
+
+BUY_FUEL_SQL = """
+    UPDATE player 
+    SET total_money = total_money - %s, fuel_amount = fuel_amount + %s 
+    WHERE player_id = %s AND total_money >= %s
+"""
+
+COLLECT_SQL = """
+    UPDATE player 
+    SET total_money = total_money + %s, cargo_collected = cargo_collected + 1 
+    WHERE player_id = %s AND end_location = %s
+"""
+
+RECORD_WIN_SQL = "UPDATE player SET won_seconds = %s WHERE player_id = %s AND won_seconds IS NULL"
+
+LEADERBOARD_COLUMNS = "player_id, screen_name, total_money, cargo_collected, won_seconds"
+
+# Each ordering matches an index from schema migration 5, so a board reads only LIMIT rows
+LEADERBOARD_SQL = {
+    "money": f"SELECT {LEADERBOARD_COLUMNS} FROM player ORDER BY total_money DESC, player_id LIMIT %s",
+    "cargo": f"SELECT {LEADERBOARD_COLUMNS} FROM player ORDER BY cargo_collected DESC, player_id LIMIT %s",
+    "fastest": f"""
+        SELECT {LEADERBOARD_COLUMNS} FROM player
+        WHERE won_seconds IS NOT NULL ORDER BY won_seconds, player_id LIMIT %s
+    """,
+}
+
+# Sort key per board for backends that rank rows themselves
+LEADERBOARD_ORDER = {
+    "money": lambda row: (-row[2], row[0]),
+    "cargo": lambda row: (-row[3], row[0]),
+    "fastest": lambda row: (row[4], row[0]),
+}
+
+# Write-behind flushes on MySQL: mysql.connector rewrites executemany of an INSERT
+# into one multi-row statement (an UPDATE runs once per row). The rows already
+# exist, so every row takes the ON DUPLICATE KEY UPDATE branch
+SAVE_PLAYERS_SQL = """
+    INSERT INTO player (player_id, fuel_amount, total_money, cargo_collected, end_location)
+    VALUES (%s, %s, %s, %s, %s) AS incoming
+    ON DUPLICATE KEY UPDATE
+        fuel_amount = incoming.fuel_amount, total_money = incoming.total_money,
+        cargo_collected = incoming.cargo_collected, end_location = incoming.end_location
+"""
+SAVE_PLAYERS_CHUNK = 1000  # rows per statement, well under max_allowed_packet
+
+
+# Settles n players' pickups in one statement: the CASEs pick each player's
+# money, cargo count and airport, and the end_location guard is kept per player.
+# Plain SQL that both MySQL and the sqlite stand-in (local_db) run.
+# Parameters: (player_id, value) x n, (player_id, pickups) x n, player_id x n,
+# (player_id, location) x n
+def collect_many_sql(n):
+    cases = " ".join(["WHEN %s THEN %s"] * n)
+    return f"""
+        UPDATE player
+        SET total_money = total_money + CASE player_id {cases} END,
+            cargo_collected = cargo_collected + CASE player_id {cases} END
+        WHERE player_id IN ({", ".join(["%s"] * n)}) AND end_location = CASE player_id {cases} END
+    """
+COLLECT_MANY_CHUNK = 1000  # players per statement
+
+STATEMENTS = {
+    "create_player": CREATE_PLAYER_SQL,
+    "get_player": GET_PLAYER_SQL,
+    "move_player": MOVE_SQL,
+    "buy_fuel": BUY_FUEL_SQL,
+    "collect_cargo": COLLECT_SQL,
+}
+
+
+# The guarded writes read success from rowcount, so MySQL connections must be
+# opened with ClientFlag.FOUND_ROWS (matched rows, not changed rows)
+class SQLStorage(Storage):
+    def __init__(self, conn):
+        self.conn = conn
+
+    @contextmanager
+    def _cursor(self, dictionary=False):
+        cursor = self.conn.cursor(dictionary=dictionary)
+        try:
+            yield cursor
+            self.conn.commit()
+        finally:
+            cursor.close()
+
+    def airport_rows(self):
+        with self._cursor() as cursor:
+            cursor.execute("""
+                SELECT airport_code, airport_name, latitude_deg, longitude_deg
+                FROM new_airports
+            """)
+            return cursor.fetchall()
+
+    def cargo_rows(self):
+        with self._cursor() as cursor:
+            cursor.execute("""
+                SELECT new_airports.airport_code, goal.value
+                FROM new_airports
+                JOIN goal ON goal.goal_id = new_airports.goal_type
+            """)
+            return cursor.fetchall()
+
+    def create_player(self, screen_name, fuel_amount, total_money, cargo_collected,
+                      start_location, destination, end_location):
+        with self._cursor() as cursor:
+            cursor.execute(CREATE_PLAYER_SQL, (screen_name, fuel_amount, total_money, cargo_collected,
+                                               start_location, destination, end_location))
+            return int(cursor.lastrowid)
+
+    def get_player(self, player_id):
+        with self._cursor(dictionary=True) as cursor:
+            cursor.execute(GET_PLAYER_SQL, (player_id,))
+            return cursor.fetchone()
+
+    def move_player(self, player_id, origin, target, fuel_needed):
+        with self._cursor() as cursor:
+            cursor.execute(MOVE_SQL, (fuel_needed, target, player_id, origin, fuel_needed))
+            return cursor.rowcount == 1
+
+    def buy_fuel(self, player_id, fuel_amount, cost):
+        with self._cursor() as cursor:
+            cursor.execute(BUY_FUEL_SQL, (cost, fuel_amount, player_id, cost))
+            return cursor.rowcount == 1
+
+    def collect_cargo(self, player_id, location, value):
+        with self._cursor() as cursor:
+            cursor.execute(COLLECT_SQL, (value, player_id, location))
+            return cursor.rowcount == 1
+
+    # One statement per chunk of players instead of a round trip per pickup.
+    # Pickups by a player at one airport are summed; a player with pickups at
+    # several airports (only one can match) gets one statement per airport
+    def collect_many(self, pickups):
+        totals = {}  # (player_id, location) -> [value, pickups]
+        for value, player_id, location in pickups:
+            total = totals.setdefault((player_id, location), [0, 0])
+            total[0] += value
+            total[1] += 1
+        rounds = []  # each round names a player at most once
+        seen = {}
+        for (player_id, location), (value, count) in totals.items():
+            n = seen.get(player_id, 0)
+            seen[player_id] = n + 1
+            if n == len(rounds):
+                rounds.append([])
+            rounds[n].append((player_id, location, value, count))
+        updated = 0
+        with self._cursor() as cursor:
+            for players in rounds:
+                for start in range(0, len(players), COLLECT_MANY_CHUNK):
+                    chunk = players[start:start + COLLECT_MANY_CHUNK]
+                    params = [p for player_id, _, value, _ in chunk for p in (player_id, value)]
+                    params += [p for player_id, _, _, count in chunk for p in (player_id, count)]
+                    params += [player_id for player_id, _, _, _ in chunk]
+                    params += [p for player_id, location, _, _ in chunk for p in (player_id, location)]
+                    cursor.execute(collect_many_sql(len(chunk)), params)
+                    updated += cursor.rowcount
+        return updated
+
+    def record_win(self, player_id, won_seconds):
+        with self._cursor() as cursor:
+            cursor.execute(RECORD_WIN_SQL, (won_seconds, player_id))
+
+    def leaderboard_rows(self, board, limit):
+        with self._cursor() as cursor:
+            cursor.execute(LEADERBOARD_SQL[board], (limit,))
+            return [tuple(row) for row in cursor.fetchall()]
+
+    def save_players(self, rows):
+        if not rows:
+            return
+        with self._cursor() as cursor:
+            cursor.executemany(
+                """
+                UPDATE player 
+                SET fuel_amount = %s, total_money = %s, cargo_collected = %s, end_location = %s 
+                WHERE player_id = %s
+                """,
+                [(row["fuel_amount"], row["total_money"], row["cargo_collected"], row["end_location"],
+                  row["player_id"]) for row in rows]
+            )
+
+
+class MySQLStorage(SQLStorage):
+    def __init__(self, db):
+        super().__init__(None)
+        self.db = db
+        for name, sql in STATEMENTS.items():
+            db.register(name, sql)
+
+    def _cursor(self, dictionary=False):
+        return self.db.cursor(dictionary=dictionary)
+
+    # The per-turn operations go through the pool's prepared statements
+    def create_player(self, screen_name, fuel_amount, total_money, cargo_collected,
+                      start_location, destination, end_location):
+        result = self.db.run("create_player", (screen_name, fuel_amount, total_money, cargo_collected,
+                                               start_location, destination, end_location))
+        return int(result.lastrowid)
+
+    def get_player(self, player_id):
+        rows = self.db.run("get_player", (player_id,), dictionary=True).rows
+        return rows[0] if rows else None
+
+    def move_player(self, player_id, origin, target, fuel_needed):
+        return self.db.run("move_player", (fuel_needed, target, player_id, origin, fuel_needed)).rowcount == 1
+
+    def buy_fuel(self, player_id, fuel_amount, cost):
+        return self.db.run("buy_fuel", (cost, fuel_amount, player_id, cost)).rowcount == 1
+
+    def collect_cargo(self, player_id, location, value):
+        return self.db.run("collect_cargo", (value, player_id, location)).rowcount == 1
+
+    def save_players(self, rows):
+        with self._cursor() as cursor:
+            for start in range(0, len(rows), SAVE_PLAYERS_CHUNK):
+                cursor.executemany(SAVE_PLAYERS_SQL, [
+                    (row["player_id"], row["fuel_amount"], row["total_money"], row["cargo_collected"],
+                     row["end_location"]) for row in rows[start:start + SAVE_PLAYERS_CHUNK]
+                ])
+
+
+class MemoryStorage(Storage):
+    def __init__(self, goal_rows=(), airport_rows=(), player_rows=()):
+        values = {goal_id: value for goal_id, _, value in goal_rows}
+        self.airports = [tuple(row[:4]) for row in airport_rows]
+        self.cargo = {row[0]: values[row[4]] for row in airport_rows if row[4] in values}
+        self.players = {}
+        self.next_id = 1
+        self.lock = threading.Lock()
+        for row in player_rows:
+            self.create_player(*row)
+
+    # In-memory copy of the synthetic data local_db.seed() writes
+    @classmethod
+    def seeded(cls, **options):
+        return cls(*synthetic_data(**options))
+
+    def airport_rows(self):
+        return list(self.airports)
+
+    def cargo_rows(self):
+        return list(self.cargo.items())
+
+    def create_player(self, screen_name, fuel_amount, total_money, cargo_collected,
+                      start_location, destination, end_location):
+        with self.lock:
+            player_id = self.next_id
+            self.next_id += 1
+            self.players[player_id] = {
+                "player_id": player_id, "screen_name": screen_name, "fuel_amount": fuel_amount,
+                "total_money": total_money, "cargo_collected": cargo_collected,
+                "start_location": start_location, "destination": destination,
+                "end_location": end_location, "won_seconds": None,
+            }
+        return player_id
+
+    def get_player(self, player_id):
+        player = self.players.get(player_id)
+        if player is None:
+            return None
+        return {"player_id": player_id, "screen_name": player["screen_name"],
+                "fuel_amount": player["fuel_amount"], "total_money": player["total_money"],
+                "cargo_collected": player["cargo_collected"], "end_location": player["end_location"]}
+
+    def move_player(self, player_id, origin, target, fuel_needed):
+        with self.lock:
+            player = self.players.get(player_id)
+            if not player or player["end_location"] != origin or player["fuel_amount"] < fuel_needed:
+                return False
+            player["fuel_amount"] -= fuel_needed
+            player["end_location"] = target
+            return True
+
+    def buy_fuel(self, player_id, fuel_amount, cost):
+        with self.lock:
+            player = self.players.get(player_id)
+            if not player or player["total_money"] < cost:
+                return False
+            player["total_money"] -= cost
+            player["fuel_amount"] += fuel_amount
+            return True
+
+    def collect_cargo(self, player_id, location, value):
+        with self.lock:
+            player = self.players.get(player_id)
+            if not player or player["end_location"] != location:
+                return False
+            player["total_money"] += value
+            player["cargo_collected"] += 1
+            return True
+
+    def collect_many(self, pickups):
+        return sum(self.collect_cargo(player_id, location, value) for value, player_id, location in pickups)
+
+    def record_win(self, player_id, won_seconds):
+        with self.lock:
+            player = self.players.get(player_id)
+            if player and player["won_seconds"] is None:
+                player["won_seconds"] = won_seconds
+
+    def leaderboard_rows(self, board, limit):
+        with self.lock:
+            rows = [(player_id, player["screen_name"], player["total_money"], player["cargo_collected"],
+                     player["won_seconds"]) for player_id, player in self.players.items()]
+        if board == "fastest":
+            rows = [row for row in rows if row[4] is not None]
+        return heapq.nsmallest(limit, rows, key=LEADERBOARD_ORDER[board])
+
+    def save_players(self, rows):
+        with self.lock:
+            for row in rows:
+                player = self.players.get(row["player_id"])
+                if player:
+                    for column in ("fuel_amount", "total_money", "cargo_collected", "end_location"):
+                        player[column] = row[column]
@@ -1,6 +1,8 @@
 import random
 import mysql.connector
 from math import radians, sin, cos, sqrt, atan2
+from airports import get_catalog
+from storage import SQLStorage
 
 def connect_to_db():
     try:
@@ -64,48 +66,22 @@ def get_airports_with_distances(player_id):
         print("Database connection failed.")
         return
 
-    cursor = conn.cursor(dictionary=True)  # Use dictionary=True for easier access to column names
+    cursor = conn.cursor()
     try:
-        # Get the end_location and its coordinates for the player
-        cursor.execute("""
-            SELECT end_location, latitude_deg, longitude_deg
-            FROM player
-            JOIN new_airports ON player.end_location = new_airports.airport_code
-            WHERE player.player_id = %s
-        """, (player_id,))
+        # Get the end_location for the player; coordinates come from the airport catalog
+        cursor.execute("SELECT end_location FROM player WHERE player_id = %s", (player_id,))
         player_location = cursor.fetchone()
+        catalog = get_catalog(SQLStorage(conn))
 
-        if not player_location:
+        if not player_location or player_location[0] not in catalog:
             print(f"No location data found for player_id {player_id}.")
             return
 
-        end_location = player_location["end_location"]
-        end_lat = float(player_location["latitude_deg"])
-        end_lon = float(player_location["longitude_deg"])
-
-        # Get all airports with their codes and coordinates
-        cursor.execute("""
-            SELECT airport_code, airport_name, latitude_deg, longitude_deg
-            FROM new_airports
-        """)
-        airports = cursor.fetchall()
+        end_location = player_location[0]
 
-        # Calculate distances and display the results
+        # Print nearest-first distances from the spatial index
         print(f"Distances from {end_location} to other airports:")
-        airport_distances = []
-        for airport in airports:
-            airport_code = airport["airport_code"]
-            airport_name = airport["airport_name"]
-            lat = float(airport["latitude_deg"])
-            lon = float(airport["longitude_deg"])
-            distance = calculate_distance(end_lat, end_lon, lat, lon)
-            airport_distances.append((airport_code, airport_name, distance))
-
-        # Sort by distance
-        airport_distances.sort(key=lambda x: x[2])
-
-        # Print sorted distances
-        for code, name, dist in airport_distances:
+        for code, name, dist in catalog.nearest(end_location):
             print(f"{code}: {dist:.2f} km")
 
     except Exception as e:
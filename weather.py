@@ -0,0 +1,67 @@
+import itertools
+import random
+import threading
+import time
+from collections import OrderedDict
+
+HIGH_CONSUMPTION = 1.6  # 60% more fuel when flying into bad weather
+BAD_WEATHER_AIRPORTS = 3
+
+
+# Unfavorable weather per player, kept in memory instead of the shared
+# new_airports.high_consumption column so games do not overwrite each other.
+# Finished games are cleared. Players unseen for idle_seconds are dropped (web
+# games are abandoned, never quit); past max_players the least recently used go
+# too, so the cap should sit well above the number of live games
+class WeatherMap:
+    def __init__(self, max_players=100_000, idle_seconds=24 * 3600):
+        self.max_players = max_players
+        self.idle_seconds = idle_seconds
+        self.evictions = 0
+        self._players = OrderedDict()  # player_id -> [frozenset of airport codes, epoch, last use], least recent first
+        self._epochs = itertools.count(1)  # process-wide, so an epoch never repeats after eviction
+        self._lock = threading.Lock()
+
+    def roll(self, player_id, airport_codes, count=BAD_WEATHER_AIRPORTS, rng=random):
+        bad = frozenset(rng.sample(airport_codes, min(count, len(airport_codes))))
+        now = time.monotonic()
+        with self._lock:
+            self._players[player_id] = [bad, next(self._epochs), now]
+            self._players.move_to_end(player_id)
+            self._evict(now)
+        return bad
+
+    def _evict(self, now):
+        while self._players:
+            player_id, entry = next(iter(self._players.items()))
+            if now - entry[2] <= self.idle_seconds and len(self._players) <= self.max_players:
+                break
+            del self._players[player_id]
+            self.evictions += 1
+
+    # (airports, epoch) for the player, marking them as still playing
+    def _touch(self, player_id):
+        with self._lock:
+            entry = self._players.get(player_id)
+            if entry is None:
+                return frozenset(), 0
+            entry[2] = time.monotonic()
+            self._players.move_to_end(player_id)
+            return entry[0], entry[1]
+
+    def airports(self, player_id):
+        return self._touch(player_id)[0]
+
+    # Changes on every roll, for caches keyed on weather; 0 when the player has none
+    def epoch(self, player_id):
+        return self._touch(player_id)[1]
+
+    def multiplier(self, player_id, airport_code):
+        return HIGH_CONSUMPTION if airport_code in self.airports(player_id) else 1.0
+
+    def clear(self, player_id):
+        with self._lock:
+            self._players.pop(player_id, None)
+
+
+weather = WeatherMap()
@@ -0,0 +1,344 @@
+# Opt-in write-behind mode: live player rows sit in this process, actions change
+# them in memory and dirty rows are written to the backend storage in one batch
+# every flush_interval seconds, when a game ends and on close().
+#
+# With journal_path set, every change is also appended to a JSONL journal
+# (optionally fsynced) so a crash loses nothing: recover() replays it on start.
+# Changes only go into a buffer under the storage lock; a journal thread writes
+# whatever has accumulated in one write (group commit) and the action waits for
+# its line outside the lock, so actions do not queue behind each other's fsync.
+# The journal is rotated at each full flush and the old file removed once the
+# batch is written, so it only ever holds changes the backend may not have.
+#
+# Clean rows (nothing left to flush) are evicted least recently used first once
+# the cache holds more than max_players, and after idle_seconds without use, so
+# players who read once or abandon a game do not stay in memory.
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from storage import Storage
+
+PLAYER_FIELDS = ("player_id", "screen_name", "fuel_amount", "total_money", "cargo_collected", "end_location")
+
+
+class WriteBehindStorage(Storage):
+    def __init__(self, backend, flush_interval=1.0, journal_path=None, fsync=False,
+                 max_players=10_000, idle_seconds=300.0):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.journal_path = journal_path
+        self.fsync = fsync
+        self.max_players = max_players
+        self.idle_seconds = idle_seconds
+        self.players = OrderedDict()  # player_id -> live row, least recently used first
+        self._used = {}  # player_id -> monotonic time of its last use
+        self.dirty = {}  # player_id -> monotonic time of its oldest unflushed change
+        self.lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._journal = None
+        self._journal_lock = threading.Lock()  # held while writing to or swapping the journal file
+        self._journal_buffer = []
+        self._journal_appended = 0  # sequence number of the last buffered line
+        self._journal_written = 0  # sequence number of the last line in the file
+        self._journal_cond = threading.Condition()
+        self._journal_closed = False
+
+        # Metrics
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.flush_errors = 0
+        self.last_flush_seconds = 0.0
+        self.last_flush_lag = 0.0
+        self.max_flush_lag = 0.0
+        self.evictions = 0
+
+        if journal_path:
+            self.recover()
+            self._journal = open(journal_path, "a", encoding="utf-8")
+            self._journal_thread = threading.Thread(target=self._run_journal, name="write-behind-journal",
+                                                    daemon=True)
+            self._journal_thread.start()
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="write-behind-flush", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Write-behind flush failed: {e}")
+            self.evict()
+
+    # Replays journal entries that may not have reached the backend before a crash
+    def recover(self):
+        latest = {}
+        for path in (self.journal_path + ".flushing", self.journal_path):
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        break  # torn last line from the crash
+                    latest[row["player_id"]] = row
+        if latest:
+            self.backend.save_players(list(latest.values()))
+        for path in (self.journal_path + ".flushing", self.journal_path):
+            if os.path.exists(path):
+                os.remove(path)
+        return len(latest)
+
+    def _live(self, player_id):
+        player = self.players.get(player_id)
+        if player is None:
+            row = self.backend.get_player(player_id)
+            if row is None:
+                return None
+            return self._cache({field: row[field] for field in PLAYER_FIELDS})
+        self.players.move_to_end(player_id)
+        self._used[player_id] = time.monotonic()
+        return player
+
+    # Makes room before inserting, so the row the caller is about to change is never the one evicted
+    def _cache(self, player):
+        if len(self.players) >= self.max_players:
+            self.evict(reserve=1)
+        self.players[player["player_id"]] = player
+        self._used[player["player_id"]] = time.monotonic()
+        return player
+
+    # Drops clean rows, least recently used first: those past max_players and
+    # those idle for idle_seconds. Dirty rows stay until a flush has written them
+    def evict(self, reserve=0):
+        with self.lock:
+            now = time.monotonic()
+            excess = len(self.players) + reserve - self.max_players
+            victims = []
+            for player_id in self.players:
+                if len(victims) >= excess and now - self._used[player_id] < self.idle_seconds:
+                    break
+                if player_id not in self.dirty:
+                    victims.append(player_id)
+            for player_id in victims:
+                del self.players[player_id]
+                del self._used[player_id]
+            self.evictions += len(victims)
+            return len(victims)
+
+    # The caller holds the lock and calls _sync_journal() once it has released it
+    def _changed(self, player):
+        self.dirty.setdefault(player["player_id"], time.monotonic())
+        if self._journal:
+            with self._journal_cond:
+                self._journal_buffer.append(json.dumps(player) + "\n")
+                self._journal_appended += 1
+
+    # Blocks until every line buffered so far is in the journal
+    def _sync_journal(self):
+        if not self.journal_path:
+            return
+        with self._journal_cond:
+            seq = self._journal_appended
+            self._journal_cond.notify_all()
+            while self._journal_written < seq and not self._journal_closed:
+                self._journal_cond.wait()
+
+    def _run_journal(self):
+        while True:
+            with self._journal_cond:
+                while not self._journal_buffer and not self._journal_closed:
+                    self._journal_cond.wait()
+                batch, self._journal_buffer = self._journal_buffer, []
+                seq = self._journal_appended
+            if not batch:
+                return
+            with self._journal_lock:
+                try:
+                    self._journal.write("".join(batch))
+                    self._journal.flush()
+                    if self.fsync:
+                        os.fsync(self._journal.fileno())
+                except OSError as e:
+                    print(f"Write-behind journal write failed: {e}")
+            with self._journal_cond:
+                self._journal_written = seq
+                self._journal_cond.notify_all()
+
+    def airport_rows(self):
+        return self.backend.airport_rows()
+
+    def cargo_rows(self):
+        return self.backend.cargo_rows()
+
+    # New players go straight to the backend, which hands out the player_id
+    def create_player(self, screen_name, fuel_amount, total_money, cargo_collected,
+                      start_location, destination, end_location):
+        player_id = self.backend.create_player(screen_name, fuel_amount, total_money, cargo_collected,
+                                               start_location, destination, end_location)
+        with self.lock:
+            self._cache({
+                "player_id": player_id, "screen_name": screen_name, "fuel_amount": fuel_amount,
+                "total_money": total_money, "cargo_collected": cargo_collected, "end_location": end_location,
+            })
+        return player_id
+
+    def get_player(self, player_id):
+        with self.lock:
+            player = self._live(player_id)
+            return dict(player) if player else None
+
+    def move_player(self, player_id, origin, target, fuel_needed):
+        with self.lock:
+            player = self._live(player_id)
+            if not player or player["end_location"] != origin or player["fuel_amount"] < fuel_needed:
+                return False
+            player["fuel_amount"] -= fuel_needed
+            player["end_location"] = target
+            self._changed(player)
+        self._sync_journal()
+        return True
+
+    def buy_fuel(self, player_id, fuel_amount, cost):
+        with self.lock:
+            player = self._live(player_id)
+            if not player or player["total_money"] < cost:
+                return False
+            player["total_money"] -= cost
+            player["fuel_amount"] += fuel_amount
+            self._changed(player)
+        self._sync_journal()
+        return True
+
+    # The caller holds the lock
+    def _collect(self, player_id, location, value):
+        player = self._live(player_id)
+        if not player or player["end_location"] != location:
+            return False
+        player["total_money"] += value
+        player["cargo_collected"] += 1
+        self._changed(player)
+        return True
+
+    def collect_cargo(self, player_id, location, value):
+        return self.collect_many([(value, player_id, location)]) == 1
+
+    # All pickups share one journal write
+    def collect_many(self, pickups):
+        with self.lock:
+            collected = sum(self._collect(player_id, location, value) for value, player_id, location in pickups)
+        if collected:
+            self._sync_journal()
+        return collected
+
+    def save_players(self, rows):
+        with self.lock:
+            for row in rows:
+                player = self._live(row["player_id"])
+                if player:
+                    player.update({field: row[field] for field in PLAYER_FIELDS[2:]})
+                    self._changed(player)
+        self._sync_journal()
+
+    # Writes dirty rows to the backend in one batch; all of them, or only player_ids
+    def flush(self, player_ids=None):
+        with self._flush_lock:
+            with self.lock:
+                ids = list(self.dirty) if player_ids is None else [pid for pid in player_ids if pid in self.dirty]
+                if not ids:
+                    return 0
+                now = time.monotonic()
+                oldest = min(self.dirty[pid] for pid in ids)
+                since = {pid: self.dirty.pop(pid) for pid in ids}
+                rows = [dict(self.players[pid]) for pid in ids]
+                rotated = player_ids is None and self._rotate_journal()
+
+            started = time.perf_counter()
+            try:
+                self.backend.save_players(rows)
+            except Exception:
+                with self.lock:
+                    self.flush_errors += 1
+                    for pid, dirtied in since.items():
+                        self.dirty[pid] = min(dirtied, self.dirty.get(pid, dirtied))
+                raise
+
+            if rotated:
+                os.remove(self.journal_path + ".flushing")
+            self.flushes += 1
+            self.rows_flushed += len(rows)
+            self.last_flush_seconds = time.perf_counter() - started
+            self.last_flush_lag = now - oldest
+            self.max_flush_lag = max(self.max_flush_lag, self.last_flush_lag)
+            return len(rows)
+
+    # Moves the current journal aside so the flush can drop it once written. Lines
+    # still buffered land in the new file, which is harmless: they are newer than
+    # anything in the old one and recovery keeps each player's latest row
+    def _rotate_journal(self):
+        if not self._journal:
+            return False
+        with self._journal_lock:
+            self._journal.close()
+            pending = self.journal_path + ".flushing"
+            if os.path.exists(pending):
+                # A previous flush failed and its rows are dirty again, so this flush covers both files
+                with open(pending, "a", encoding="utf-8") as out, open(self.journal_path, encoding="utf-8") as f:
+                    out.write(f.read())
+                os.remove(self.journal_path)
+            else:
+                os.replace(self.journal_path, pending)
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        return True
+
+    # Reads the backend as is: rows may lag the cache by up to flush_interval, and
+    # the leaderboard keeps its own live totals for the players it ranks
+    def leaderboard_rows(self, board, limit):
+        return self.backend.leaderboard_rows(board, limit)
+
+    def record_win(self, player_id, won_seconds):
+        self.backend.record_win(player_id, won_seconds)
+
+    # Flushes the finished game right away and stops caching the player
+    def end_game(self, player_id):
+        self.flush([player_id])
+        with self.lock:
+            if player_id not in self.dirty and self.players.pop(player_id, None) is not None:
+                del self._used[player_id]
+        self.backend.end_game(player_id)
+
+    def metrics(self):
+        with self.lock:
+            now = time.monotonic()
+            return {
+                "live_players": len(self.players),
+                "evictions": self.evictions,
+                "dirty_players": len(self.dirty),
+                "oldest_dirty_seconds": now - min(self.dirty.values()) if self.dirty else 0.0,
+                "flushes": self.flushes,
+                "rows_flushed": self.rows_flushed,
+                "flush_errors": self.flush_errors,
+                "last_flush_seconds": self.last_flush_seconds,
+                "last_flush_lag_seconds": self.last_flush_lag,
+                "max_flush_lag_seconds": self.max_flush_lag,
+            }
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+        if self._journal:
+            with self._journal_cond:
+                self._journal_closed = True
+                self._journal_cond.notify_all()
+            self._journal_thread.join()
+            self._journal.close()
+            self._journal = None
+            if os.path.exists(self.journal_path) and not os.path.getsize(self.journal_path):
+                os.remove(self.journal_path)
+        self.backend.close()